@@ -1,13 +1,14 @@
 from __future__ import annotations
 import os
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
-from dotenv import load_dotenv
 
-load_dotenv()
+_dotenv_loaded = False
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class Settings:
     wp_base_url: str
     wc_consumer_key: Optional[str]
@@ -20,15 +21,36 @@ class Settings:
     download_media: bool = True
     headless: bool = True
     db_path: Path = Path("wooparser.db")
+    push_concurrency: int = 8
+    variation_workers: int = 4
+    http_cache_dir: Optional[Path] = None
+    http_cache_ttl: int = 86400
+    max_page_bytes: int = 10 * 1024 * 1024
+    debug_http_cache: bool = False
+
+
+_TRUTHY = frozenset(("1", "true", "yes", "y", "on", "t"))
 
 
 def str_to_bool(val: Optional[str], default: bool) -> bool:
     if val is None:
         return default
-    return val.strip().lower() in {"1", "true", "yes", "y"}
+    return val.strip().lower() in _TRUTHY
+
+
+def _load_dotenv_once() -> None:
+    # .env читаем при первом обращении к настройкам, а не при импорте (быстрее --help)
+    global _dotenv_loaded
+    if not _dotenv_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _dotenv_loaded = True
 
 
+@lru_cache(maxsize=1)
 def get_settings() -> Settings:
+    # Настройки собираются один раз на процесс; после изменения os.environ нужен get_settings.cache_clear()
+    _load_dotenv_once()
     return Settings(
         wp_base_url=os.getenv("WP_BASE_URL", "").rstrip("/"),
         wc_consumer_key=os.getenv("WC_CONSUMER_KEY"),
@@ -40,5 +62,11 @@ def get_settings() -> Settings:
         rate_limit_rps=float(os.getenv("RATE_LIMIT_RPS", "0.5")),
         download_media=str_to_bool(os.getenv("DOWNLOAD_MEDIA"), True),
         headless=str_to_bool(os.getenv("HEADLESS"), True),
-        db_path=Path(os.getenv("DB_PATH", "wooparser.db")),
+        db_path=Path(os.getenv("DB_PATH", "wooparser.db")).resolve(),
+        push_concurrency=int(os.getenv("PUSH_CONCURRENCY", "8")),
+        variation_workers=int(os.getenv("VARIATION_WORKERS", "4")),
+        http_cache_dir=Path(os.environ["HTTP_CACHE_DIR"]).resolve() if os.getenv("HTTP_CACHE_DIR") else None,
+        http_cache_ttl=int(os.getenv("HTTP_CACHE_TTL", "86400")),
+        max_page_bytes=int(os.getenv("MAX_PAGE_BYTES", str(10 * 1024 * 1024))),
+        debug_http_cache=str_to_bool(os.getenv("DEBUG_HTTP_CACHE"), False),
     )
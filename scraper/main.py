@@ -1,12 +1,36 @@
 from __future__ import annotations
-import json
+from functools import lru_cache
 from pathlib import Path
 from typing import List, Optional
 import os
 import typer
-from rich import print as rprint
 
-app = typer.Typer(add_completion=False, help="CLI для парсинга и загрузки в WooCommerce")
+
+def rprint(*args, **kwargs) -> None:
+    # rich импортируем лениво: --help и ошибки разбора аргументов его не требуют
+    from rich import print as _rprint
+    _rprint(*args, **kwargs)
+
+
+_httpx = None
+
+
+def _get_httpx():
+    # httpx нужен только командам заливки: импортируем один раз при первом вызове, а не на каждый товар
+    global _httpx
+    if _httpx is None:
+        import httpx as _mod
+        _httpx = _mod
+    return _httpx
+
+
+@lru_cache(maxsize=1024)
+def _fmt_price(price: float) -> str:
+    # у вариаций цены часто повторяются (объёмы/скидки) — форматируем каждую один раз
+    return f"{price:.2f}"
+
+
+app = typer.Typer(add_completion=False, rich_markup_mode="rich", help="CLI для парсинга и загрузки в WooCommerce")
 
 
 @app.callback()
@@ -37,6 +61,9 @@ def main_callback(
         os.environ["CLI_INCLUDE"] = ",".join(include)
     if exclude:
         os.environ["CLI_EXCLUDE"] = ",".join(exclude)
+    # overrides выше должны попасть в кэшированные настройки
+    from .config import get_settings
+    get_settings.cache_clear()
 
 @app.command("init-db")
 def init_db_cmd(db: Path = typer.Option(Path("wooparser.db"), "--db", help="Путь к SQLite БД")) -> None:
@@ -44,14 +71,14 @@ def init_db_cmd(db: Path = typer.Option(Path("wooparser.db"), "--db", help="Пу
     init_db(db)
     rprint(f"[green]OK[/green] База инициализирована: {db}")
 
-preview_app = typer.Typer(help="Превью данных")
+preview_app = typer.Typer(rich_markup_mode="rich", help="Превью данных")
 app.add_typer(preview_app, name="preview")
 
 @preview_app.command("product")
 def preview_product(profile: str = typer.Option(..., "--profile"), url: str = typer.Option(..., "--url")) -> None:
     from .scrape import scrape_product
     product = scrape_product(url=url, profile=profile)
-    rprint(json.dumps(product.model_dump(), ensure_ascii=False, indent=2))
+    rprint(product.model_dump_json(indent=2))
 
 @preview_app.command("category")
 def preview_category(
@@ -61,10 +88,22 @@ def preview_category(
     offset: int = 0,
     max_pages: int = typer.Option(None, "--max-pages")
 ) -> None:
+    from itertools import islice
     from .scrape import collect_category_urls
-    urls = collect_category_urls(category_url=url, profile=profile, limit=limit, offset=offset, max_pages=max_pages)
+    urls = list(islice(collect_category_urls(category_url=url, profile=profile, max_pages=max_pages), offset, offset + limit))
     rprint({"count": len(urls), "sample": urls[:5]})
 
+def _write_urls(out: Path, urls) -> int:
+    # пишем построчно, без склейки всего списка в одну большую строку
+    out.parent.mkdir(parents=True, exist_ok=True)
+    written = 0
+    with out.open("w", encoding="utf-8", buffering=1 << 20) as f:
+        for u in urls:
+            f.write(u + "\n")
+            written += 1
+    return written
+
+
 @app.command("collect")
 def collect(
     profile: str = typer.Option(..., "--profile"),
@@ -73,11 +112,12 @@ def collect(
     limit: int = typer.Option(1000, "--limit"),
     offset: int = typer.Option(0, "--offset"),
 ) -> None:
+    from itertools import islice
     from .scrape import collect_category_urls
-    urls = collect_category_urls(category_url=from_category, profile=profile, limit=limit, offset=offset)
-    out.parent.mkdir(parents=True, exist_ok=True)
-    out.write_text("\n".join(urls) + ("\n" if urls else ""), encoding="utf-8")
-    rprint({"written": len(urls), "file": str(out)})
+    # URL пишутся в файл по мере обхода страниц; при прерывании остаётся частичный результат
+    urls = islice(collect_category_urls(category_url=from_category, profile=profile), offset, offset + limit)
+    written = _write_urls(out, urls)
+    rprint({"written": written, "file": str(out)})
 
 @app.command("collect-all")
 def collect_all(
@@ -87,9 +127,8 @@ def collect_all(
 ) -> None:
     from .scrape import collect_all_product_urls
     urls = collect_all_product_urls(profile=profile, limit_per_category=limit_per_category)
-    out.parent.mkdir(parents=True, exist_ok=True)
-    out.write_text("\n".join(urls) + ("\n" if urls else ""), encoding="utf-8")
-    rprint({"written": len(urls), "file": str(out)})
+    written = _write_urls(out, urls)
+    rprint({"written": written, "file": str(out)})
 
 @app.command("cluster-preview")
 def cluster_preview(profile: str = typer.Option(..., "--profile"), from_category: str = typer.Option(..., "--from-category"), limit: int = 50) -> None:
@@ -99,10 +138,24 @@ def cluster_preview(profile: str = typer.Option(..., "--profile"), from_category
 
 
 @app.command("debug-variations")
-def debug_variations_cmd(profile: str = typer.Option(..., "--profile"), url: str = typer.Option(..., "--url")) -> None:
-    from .scrape import debug_variations as do_debug
-    rows = do_debug(url=url, profile=profile)
-    rprint(rows)
+def debug_variations_cmd(
+    profile: str = typer.Option(..., "--profile"),
+    url: Optional[str] = typer.Option(None, "--url"),
+    file: Optional[Path] = typer.Option(None, "--file", help="Файл со списком URL товаров"),
+    limit: int = typer.Option(50, "--limit"),
+    offset: int = typer.Option(0, "--offset"),
+    workers: int = typer.Option(4, "--workers", help="Сколько товаров разбирать параллельно"),
+) -> None:
+    if bool(url) == bool(file):
+        rprint("[red]Укажите ровно одно: --url или --file[/red]")
+        raise typer.Exit(code=2)
+    if url:
+        from .scrape import debug_variations as do_debug
+        rprint(do_debug(url=url, profile=profile))
+        return
+    from .scrape import debug_variations_batch, iterate_urls_from_file
+    for product_url, rows in debug_variations_batch(iterate_urls_from_file(file, limit=limit, offset=offset), profile, workers=workers):
+        rprint({product_url: rows})
 
 
 
@@ -118,32 +171,115 @@ def validate(profile: str = typer.Option(..., "--profile"), url: str = typer.Opt
         raise typer.Exit(code=1)
     rprint("[green]OK[/green] Валидация пройдена")
 
-@app.command("push-product")
-def push_product(profile: str = typer.Option(..., "--profile"), url: str = typer.Option(..., "--url"), draft: bool = typer.Option(False, "--draft", help="Создать черновик"), publish: bool = typer.Option(False, "--publish", help="Опубликовать")) -> None:
-    from .scrape import scrape_product
-    from .transform import to_woo_product_payload
-    from .wc import WooClient
-    from .config import get_settings
-    from .store import upsert_product_checkpoint, get_checkpoint_by_external_id
-    import httpx
-
-    settings = get_settings()
+def _resolve_status(draft: bool, publish: bool) -> str:
     if draft and publish:
         rprint("[red]Нельзя использовать --draft и --publish одновременно[/red]")
         raise typer.Exit(code=2)
-    status = "draft" if draft else ("publish" if publish else "draft")
+    return "draft" if draft else ("publish" if publish else "draft")
 
-    product = scrape_product(url=url, profile=profile)
-    payload = to_woo_product_payload(product, status=status)
 
-    client = WooClient.from_settings(settings)
+def _upsert_product(client, existing, payload: dict) -> dict:
+    httpx = _get_httpx()
+
+    if existing and existing.get("woo_product_id"):
+        try:
+            return client.update_product(existing["woo_product_id"], payload)
+        except httpx.HTTPStatusError as e:
+            if e.response is not None and e.response.status_code in (400, 404):
+                return client.create_product(payload)
+            raise
+    return client.create_product(payload)
+
+
+def _upsert_product_with_extras(client, existing, payload: dict, extras: dict) -> dict:
+    # Категории/бренд/атрибуты уходят одним запросом вместе с товаром
+    httpx = _get_httpx()
 
-    existing = get_checkpoint_by_external_id(product.external_id, db_path=settings.db_path)
+    if not extras:
+        return _upsert_product(client, existing, payload)
+    combined = {**payload, **extras}
+    try:
+        # существующий товар только обновляем: 400 здесь может быть из-за extras, и create по нему дал бы дубль
+        if existing and existing.get("woo_product_id"):
+            try:
+                return client.update_product(existing["woo_product_id"], combined)
+            except httpx.HTTPStatusError as e:
+                # товар удалён в Woo — создаём заново, как и _upsert_product
+                if e.response is None or e.response.status_code != 404:
+                    raise
+                existing = None
+        return client.create_product(combined)
+    except httpx.HTTPStatusError as e:
+        if e.response is None or e.response.status_code != 400:
+            raise
+    # Woo отверг составной payload — заливаем базовые поля и досылаем остальное по одному, как раньше;
+    # существующий товар и здесь только обновляем (create при 400 дал бы дубль)
+    if existing and existing.get("woo_product_id"):
+        result = client.update_product(existing["woo_product_id"], payload)
+    else:
+        result = client.create_product(payload)
+    for key, value in extras.items():
+        try:
+            client.update_product(result["id"], {key: value})
+        except Exception as e:
+            rprint(f"[yellow]Woo отклонил {key} для товара {result['id']}: {e}[/yellow]")
+    return result
+
+
+def _resolve_category_ids(client, product) -> list[int]:
+    # product.categories уже содержит список слугов от донора, упорядоченных по вложенности
+    if not product.categories:
+        return []
+    try:
+        return client.ensure_categories_hierarchy(product.categories, getattr(product, "category_names", None))
+    except Exception:
+        return []
+
+
+def _unchanged_checkpoint(url: str, http, settings, checkpoints=None) -> tuple[Optional[dict], Optional[str]]:
+    # До скрапинга: если страница донора не менялась с прошлой заливки, товар можно не трогать
+    from .scrape import _external_id_from_url, _page_fingerprint
+    from .store import get_checkpoint_by_external_id
+
+    fingerprint = _page_fingerprint(url, http)
+    if not fingerprint:
+        return None, None
+    ext = _external_id_from_url(url)
+    existing = checkpoints.get(ext) if checkpoints else get_checkpoint_by_external_id(ext, db_path=settings.db_path)
+    if existing and existing.get("woo_product_id") and existing.get("content_hash") == fingerprint:
+        return existing, fingerprint
+    return None, fingerprint
+
+
+def _push_product(product, client, settings, status: str, content_hash: Optional[str] = None, checkpoints=None) -> dict:
+    # Ядро заливки: клиент Woo передаётся снаружи, чтобы push-batch переиспользовал его кэши
+    from .transform import to_woo_product_payload
+    from .store import upsert_product_checkpoint, get_checkpoint_by_external_id
+
+    payload = to_woo_product_payload(product, status=status)
+    extras: dict = {}
+
+    if checkpoints:
+        existing = checkpoints.get(product.external_id)
+    else:
+        existing = get_checkpoint_by_external_id(product.external_id, db_path=settings.db_path)
+    cat_ids = _resolve_category_ids(client, product)
+    if cat_ids:
+        extras["categories"] = [{"id": cid} for cid in cat_ids]
     if product.type == "variable":
         # Определяем вариативный атрибут (например, pa_obyem), исключая бренд
-        var_pa_slug = next((k for k, v in product.attributes.items() if k.startswith("pa_") and k != "pa_brand" and len(v) > 1), None)
-        if not var_pa_slug:
-            var_pa_slug = next((k for k in product.attributes.keys() if k.startswith("pa_") and k != "pa_brand"), None)
+        # один проход: первый pa_* с несколькими значениями, иначе первый pa_* вообще
+        var_pa_slug = None
+        fallback = None
+        for k, v in product.attributes.items():
+            if not k.startswith("pa_") or k == "pa_brand":
+                continue
+            if fallback is None:
+                fallback = k
+            if len(v) > 1:
+                var_pa_slug = k
+                break
+        var_pa_slug = var_pa_slug or fallback
         # ensure variable attribute and its terms
         parent_attrs = []
         if var_pa_slug:
@@ -164,34 +300,11 @@ def push_product(profile: str = typer.Option(..., "--profile"), url: str = typer
         brand_opts = product.attributes.get("pa_brand", [])
         if brand_opts:
             brand_term = client.ensure_term_in_taxonomy("product_brand", brand_opts[0])
-            payload.setdefault("brands", [])
-            payload["brands"] = [{"id": brand_term.get("id")}] if brand_term.get("id") else [{"name": brand_opts[0]}]
+            extras["brands"] = [{"id": brand_term.get("id")}] if brand_term.get("id") else [{"name": brand_opts[0]}]
         if parent_attrs:
             payload["attributes"] = parent_attrs
         # create/update parent variable product
-        if existing and existing.get("woo_product_id"):
-            try:
-                result = client.update_product(existing["woo_product_id"], payload)
-            except httpx.HTTPStatusError as e:
-                if e.response is not None and e.response.status_code in (400, 404):
-                    result = client.create_product(payload)
-                else:
-                    raise
-        else:
-            result = client.create_product(payload)
-        # Проставим категории: сопоставим слуги Woo и создадим при необходимости, сохраняя иерархию
-        # product.categories уже содержит список слугов от донора, упорядоченных по вложенности
-        cat_ids: list[int] = []
-        if product.categories:
-            try:
-                cat_ids = client.ensure_categories_hierarchy(product.categories, getattr(product, "category_names", None))
-            except Exception:
-                cat_ids = []
-        if cat_ids:
-            try:
-                client.update_product(result["id"], {"categories": [{"id": cid} for cid in cat_ids]})
-            except Exception:
-                pass
+        result = _upsert_product_with_extras(client, existing, payload, extras)
 
         # create variations based on var_pa_slug
         if var_pa_slug and parent_attrs:
@@ -212,9 +325,9 @@ def push_product(profile: str = typer.Option(..., "--profile"), url: str = typer
                     elif base_price is not None:
                         price = base_price
                     if price is not None:
-                        vp["regular_price"] = f"{price:.2f}"
+                        vp["regular_price"] = _fmt_price(price)
                     if v and v.sale_price is not None:
-                        vp["sale_price"] = f"{v.sale_price:.2f}"
+                        vp["sale_price"] = _fmt_price(v.sale_price)
                     if v and v.image_url:
                         vp["image"] = {"src": v.image_url}
                     if v and v.sku:
@@ -222,34 +335,12 @@ def push_product(profile: str = typer.Option(..., "--profile"), url: str = typer
                     var_payloads.append(vp)
                 client.create_variations(result["id"], var_payloads)
     else:
-        if existing and existing.get("woo_product_id"):
-            try:
-                result = client.update_product(existing["woo_product_id"], payload)
-            except httpx.HTTPStatusError as e:
-                if e.response is not None and e.response.status_code in (400, 404):
-                    result = client.create_product(payload)
-                else:
-                    raise
-        else:
-            result = client.create_product(payload)
-        # Категории для simple
-        cat_ids: list[int] = []
-        if product.categories:
-            try:
-                cat_ids = client.ensure_categories_hierarchy(product.categories, getattr(product, "category_names", None))
-            except Exception:
-                cat_ids = []
-        if cat_ids:
-            try:
-                client.update_product(result["id"], {"categories": [{"id": cid} for cid in cat_ids]})
-            except Exception:
-                pass
         # Бренд для simple через таксономию product_brand
         brand_opts = product.attributes.get("pa_brand", [])
         if brand_opts:
             try:
                 brand_term = client.ensure_term_in_taxonomy("product_brand", brand_opts[0])
-                client.update_product(result["id"], {"brands": ([{"id": brand_term.get("id")}] if brand_term.get("id") else [{"name": brand_opts[0]}])})
+                extras["brands"] = [{"id": brand_term.get("id")}] if brand_term.get("id") else [{"name": brand_opts[0]}]
             except Exception:
                 pass
         # Невариативные атрибуты для simple: создадим/обновим глобальные и привяжем к продукту
@@ -266,13 +357,59 @@ def push_product(profile: str = typer.Option(..., "--profile"), url: str = typer
             except Exception:
                 continue
         if simple_attrs_payload:
-            try:
-                client.update_product(result["id"], {"attributes": simple_attrs_payload})
-            except Exception:
-                pass
-    upsert_product_checkpoint(product.external_id, result["id"], db_path=settings.db_path)
+            extras["attributes"] = simple_attrs_payload
+        result = _upsert_product_with_extras(client, existing, payload, extras)
+    if checkpoints:
+        checkpoints.upsert(product.external_id, result["id"], content_hash=content_hash)
+    else:
+        upsert_product_checkpoint(product.external_id, result["id"], db_path=settings.db_path, content_hash=content_hash)
+    return result
+
+
+@app.command("push-product")
+def push_product(
+    profile: str = typer.Option(..., "--profile"),
+    url: str = typer.Option(..., "--url"),
+    draft: bool = typer.Option(False, "--draft", help="Создать черновик"),
+    publish: bool = typer.Option(False, "--publish", help="Опубликовать"),
+    only_if_changed: bool = typer.Option(False, "--only-if-changed", help="Не парсить и не заливать, если ETag/Last-Modified страницы не изменились"),
+) -> None:
+    from .scrape import scrape_product, _http_client
+    from .wc import WooClient
+    from .config import get_settings
+
+    settings = get_settings()
+    status = _resolve_status(draft, publish)
+    with _http_client(settings) as http:
+        fingerprint = None
+        if only_if_changed:
+            unchanged, fingerprint = _unchanged_checkpoint(url, http, settings)
+            if unchanged:
+                rprint({"woo_product_id": unchanged["woo_product_id"], "status": "unchanged"})
+                return
+        product = scrape_product(url=url, profile=profile, client=http)
+    with WooClient.from_settings(settings) as client:
+        result = _push_product(product, client, settings, status, content_hash=fingerprint)
     rprint({"woo_product_id": result["id"], "status": result.get("status")})
 
+def _substring_regex(patterns: List[str]):
+    # все подстроки фильтра — в одну альтернативу: один проход regex-движка на URL вместо цикла по шаблонам
+    import re
+    parts = [re.escape(p) for p in patterns if p]
+    return re.compile("|".join(parts)) if parts else None
+
+
+def _filter_urls(urls, include_re, exclude_re):
+    # фильтруем всю пачку через builtin filter/filterfalse с bound-методом .search:
+    # цикл и вызов regex идут в C, без Python-функции на каждый URL
+    from itertools import filterfalse
+    if include_re is not None:
+        urls = filter(include_re.search, urls)
+    if exclude_re is not None:
+        urls = filterfalse(exclude_re.search, urls)
+    return urls
+
+
 @app.command("push-batch")
 def push_batch(
     profile: str = typer.Option(..., "--profile"),
@@ -282,44 +419,72 @@ def push_batch(
     limit: int = 50,
     offset: int = 0,
     resume: bool = False,
-    skip_processed: bool = typer.Option(False, "--skip-processed", help="Пропускать URL, уже прошедшие через checkpoint")
+    skip_processed: bool = typer.Option(False, "--skip-processed", help="Пропускать URL, уже прошедшие через checkpoint"),
+    only_if_changed: bool = typer.Option(False, "--only-if-changed", help="Пропускать URL, у которых ETag/Last-Modified не изменились с прошлой заливки"),
+    concurrency: Optional[int] = typer.Option(None, "--concurrency", help="Число параллельных воркеров (override PUSH_CONCURRENCY; 1 — последовательно)"),
 ) -> None:
-    from .scrape import iterate_urls_from_file, _external_id_from_url
-    from .store import get_checkpoint_by_external_id
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from .scrape import iterate_urls_from_file, _external_id_from_url, scrape_product, _http_client
+    from .store import checkpoint_batch
     from .config import get_settings
+    from .wc import WooClient
     include_patterns = os.environ.get("CLI_INCLUDE", "").split(",") if os.environ.get("CLI_INCLUDE") else []
     exclude_patterns = os.environ.get("CLI_EXCLUDE", "").split(",") if os.environ.get("CLI_EXCLUDE") else []
 
-    def allowed(u: str) -> bool:
-        if include_patterns:
-            if not any(p for p in include_patterns if p and p in u):
-                return False
-        if exclude_patterns:
-            if any(p for p in exclude_patterns if p and p in u):
-                return False
-        return True
+    include_re = _substring_regex(include_patterns)
+    exclude_re = _substring_regex(exclude_patterns)
 
     settings = get_settings()
-    for url in iterate_urls_from_file(file, limit=limit, offset=offset):
-        if not allowed(str(url)):
-            continue
-        try:
-            if skip_processed:
-                ext = _external_id_from_url(str(url))
-                chk = get_checkpoint_by_external_id(ext, db_path=settings.db_path)
-                if chk and chk.get("woo_product_id"):
-                    rprint(f"[yellow]SKIP processed[/yellow]: {url}")
-                    continue
-            # вызывать как обычную функцию
-            push_product(profile=profile, url=str(url), draft=draft, publish=publish)
-        except SystemExit as e:
-            if resume:
-                rprint(f"[yellow]Ошибка для {url}, продолжаю (--resume)[/yellow]")
-                continue
-            raise
-        except Exception as e:
-            if resume:
-                rprint(f"[yellow]Исключение для {url}: {e}; продолжаю (--resume)[/yellow]")
-                continue
-            raise
+    status = _resolve_status(draft, publish)
+    workers = max(1, concurrency or settings.push_concurrency)
+    # один клиент на весь батч: кэши атрибутов/термов/брендов живут между товарами
+    client = WooClient.from_settings(settings)
+
+    def push_one(url: str, http, checkpoints) -> Optional[dict]:
+        if skip_processed:
+            chk = checkpoints.get(_external_id_from_url(url))
+            if chk and chk.get("woo_product_id"):
+                return None
+        fingerprint = None
+        if only_if_changed:
+            unchanged, fingerprint = _unchanged_checkpoint(url, http, settings, checkpoints)
+            if unchanged:
+                return {"id": unchanged["woo_product_id"], "status": "unchanged"}
+        product = scrape_product(url=url, profile=profile, client=http)
+        return _push_product(product, client, settings, status, content_hash=fingerprint, checkpoints=checkpoints)
 
+    # и один HTTP-клиент для донора: соединения переиспользуются между URL и потоками;
+    # чекпоинты пишутся в одну транзакцию на пачку товаров
+    with client, checkpoint_batch(settings.db_path) as checkpoints, _http_client(settings) as http, ThreadPoolExecutor(max_workers=workers) as pool:
+        client.prefetch_indexes()
+        # воркеры читают чекпоинт до того, как соседний товар залит: один external_id в двух потоках
+        # дал бы два create в Woo, поэтому дубли отсекаем до постановки в пул
+        futures = {}
+        seen_ids: set[str] = set()
+        for url in _filter_urls(iterate_urls_from_file(file, limit=limit, offset=offset), include_re, exclude_re):
+            ext = _external_id_from_url(url)
+            if ext in seen_ids:
+                rprint(f"[yellow]SKIP duplicate[/yellow]: {url}")
+                continue
+            seen_ids.add(ext)
+            futures[pool.submit(push_one, url, http, checkpoints)] = url
+        for fut in as_completed(futures):
+            url = futures[fut]
+            try:
+                result = fut.result()
+            except SystemExit:
+                if resume:
+                    rprint(f"[yellow]Ошибка для {url}, продолжаю (--resume)[/yellow]")
+                    continue
+                pool.shutdown(cancel_futures=True)
+                raise
+            except Exception as e:
+                if resume:
+                    rprint(f"[yellow]Исключение для {url}: {e}; продолжаю (--resume)[/yellow]")
+                    continue
+                pool.shutdown(cancel_futures=True)
+                raise
+            if result is None:
+                rprint(f"[yellow]SKIP processed[/yellow]: {url}")
+            else:
+                rprint({"woo_product_id": result["id"], "status": result.get("status")})
@@ -1,6 +1,50 @@
 from __future__ import annotations
-from typing import Tuple
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import unquote, urlsplit
+import httpx
+from .config import get_settings
 
-def download_image(url: str) -> Tuple[str, bytes]:
-    # Минимальный E2E без реальной загрузки изображений
-    return ("placeholder.jpg", b"")
+CHUNK_SIZE = 64 * 1024
+
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+
+
+def _get_client() -> httpx.Client:
+    # один пул соединений на процесс: картинки обычно лежат на одном хосте донора, по HTTP/2 — в одном соединении
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(
+                timeout=get_settings().requests_timeout,
+                follow_redirects=True,
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=32),
+            )
+        return _client
+
+
+def _filename_from_url(url: str) -> str:
+    name = unquote(urlsplit(url).path.rsplit("/", 1)[-1])
+    return name or "image"
+
+
+def download_image(url: str) -> Tuple[str, Path, str]:
+    # Потоково пишем во временный файл, не держа картинку в памяти; хэш считаем в том же проходе (для дедупа)
+    filename = _filename_from_url(url)
+    digest = hashlib.blake2b(digest_size=16)
+    tmp = tempfile.NamedTemporaryFile(prefix="wooparser-", suffix=Path(filename).suffix, delete=False)
+    try:
+        with tmp, _get_client().stream("GET", url) as resp:
+            resp.raise_for_status()
+            for chunk in resp.iter_bytes(CHUNK_SIZE):
+                tmp.write(chunk)
+                digest.update(chunk)
+    except Exception:
+        Path(tmp.name).unlink(missing_ok=True)
+        raise
+    return filename, Path(tmp.name), digest.hexdigest()
@@ -2,6 +2,8 @@ from __future__ import annotations
 from typing import Dict, List, Optional, Literal
 from pydantic import BaseModel, Field
 
+# Image/Variation в scrape.py создаются через model_construct (поля уже приведены к нужным типам),
+# Product собирается обычным конструктором и валидируется целиком.
 class Image(BaseModel):
     url: str
     alt: Optional[str] = None
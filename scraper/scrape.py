@@ -1,12 +1,17 @@
 from __future__ import annotations
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlsplit
 import csv
 import re
 import httpx
-import hashlib
-from bs4 import BeautifulSoup, Tag
+from tenacity import retry, retry_if_exception, retry_if_result, stop_after_attempt, wait_exponential
+from selectolax.lexbor import LexborHTMLParser, LexborNode, SelectolaxError
 from slugify import slugify
 import yaml
 from .models import Product, Image, Variation
@@ -17,6 +22,31 @@ logger = get_logger("scrape")
 
 FIXTURE_URL = "https://example.com/fixture"
 
+# Фиксированная разметка донора (не из манифеста): строки селекторов в одном месте для всех парсеров
+_OPTION_BUTTONS_SEL = ".product__modifications .modification .modification__body .modification__list .modification__button"
+_MODIFICATIONS_FORM_SEL = ".product__modifications form[method=post]"
+_PARAM_INPUT_SEL = 'input[name^="param["]'
+_GALLERY_FIRST_IMG_SEL = ".gallery__photos .gallery__item:first-child .gallery__photo-img"
+_GENERIC_PRICE_SEL = ".product-price__item"
+
+# типы запросов, которые Playwright-фолбэк не грузит
+_PW_BLOCKED_RESOURCES = frozenset(("image", "font", "media"))
+
+# C-загрузчик libyaml, если PyYAML собран с ним; иначе чистый Python
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+_PRICE_STRIP_RE = re.compile(r"[^0-9,\.]+")
+_ARTIKUL_RE = re.compile(r"^\s*Артикул\s*:\s*", re.IGNORECASE)
+_ML_URL_RE = re.compile(r"-(\d+)-ml/?$")
+_DIGITS_RE = re.compile(r"(\d+)")
+
+# поле вариации -> (допустимые типы, ключи JSON-ответа по убыванию приоритета — как у фронтенда донора)
+_AJAX_JSON_FIELDS: Tuple[Tuple[str, Tuple[type, ...], Tuple[str, ...]], ...] = (
+    ("price", (str, int, float), ("price", "regular_price", "price_html", "new_price")),
+    ("sku", (str,), ("sku", "article", "code")),
+    ("image", (str,), ("image", "image_url", "img")),
+)
+
 
 def _workspace_root() -> Path:
     # Предполагаем, что модуль запущен из корня проекта (/workspaces/wooparser)
@@ -27,96 +57,350 @@ def _profile_dir(profile: str) -> Path:
     return _workspace_root() / "profiles" / profile
 
 
+# Профиль читается на каждый товар: парсинг кэшируем по (путь, mtime), правка файла сбрасывает кэш.
+# Возвращаемые словари общие — вызывающие их не изменяют.
+def _mtime_ns(path: Path) -> Optional[int]:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
 def _load_manifest(profile: str) -> Dict:
     mf = _profile_dir(profile) / "manifest.yaml"
+    return _read_manifest(mf, _mtime_ns(mf))
+
+
+@lru_cache(maxsize=None)
+def _read_manifest(mf: Path, mtime_ns: Optional[int]) -> Dict:
     with mf.open("r", encoding="utf-8") as f:
-        return yaml.safe_load(f) or {}
+        return yaml.load(f, Loader=_YAML_LOADER) or {}
+
+
+_PRODUCT_SELECTOR_KEYS = ("title", "sku", "price_sale", "price_regular", "description_html", "gallery_imgs")
+
+
+def _product_selectors(profile: str) -> Dict[str, Optional[str]]:
+    mf = _profile_dir(profile) / "manifest.yaml"
+    return _read_product_selectors(mf, _mtime_ns(mf))
+
+
+@lru_cache(maxsize=None)
+def _read_product_selectors(mf: Path, mtime_ns: Optional[int]) -> Dict[str, Optional[str]]:
+    # Селекторы товара разбираем и проверяем один раз на версию манифеста: пустой -> None (поле не извлекаем),
+    # битый CSS — понятная ошибка сразу, а не на середине батча
+    raw = _read_manifest(mf, mtime_ns).get("product", {}).get("selectors", {})
+    probe = LexborHTMLParser("")
+    selectors: Dict[str, Optional[str]] = {}
+    for key in _PRODUCT_SELECTOR_KEYS:
+        css = (raw.get(key) or "").strip() or None
+        if css:
+            try:
+                probe.css_first(css)
+            except SelectolaxError as e:
+                raise ValueError(f"product.selectors.{key}: некорректный CSS-селектор {css!r}") from e
+        selectors[key] = css
+    return selectors
+
+
+def _css_first(node, css: Optional[str]) -> Optional[LexborNode]:
+    return node.css_first(css) if css else None
 
 
 def _load_csv_map(path: Path) -> Dict[str, str]:
-    mapping: Dict[str, str] = {}
-    if not path.exists():
-        return mapping
-    with path.open("r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        headers = [h.strip() for h in (reader.fieldnames or [])]
-        rows = list(reader)
-    if path.name == "attributes.map.csv":
-        # donor_name,pa_slug,is_variation
-        for r in rows:
-            donor = (r.get("donor_name") or "").strip()
-            pa = (r.get("pa_slug") or "").strip()
-            if donor and pa:
-                mapping[donor] = pa
-    elif path.name == "categories.map.csv":
-        # donor_path,woo_category_slug
-        for r in rows:
-            donor = (r.get("donor_path") or "").strip()
-            slug = (r.get("woo_category_slug") or "").strip()
-            if donor and slug:
-                mapping[donor] = slug
-    else:
-        # values/*.csv: donor_value,normalized_value
-        for r in rows:
-            donor = (r.get("donor_value") or "").strip()
-            norm = (r.get("normalized_value") or "").strip()
-            if donor:
-                mapping[donor] = norm or donor
-    return mapping
+    mtime_ns = _mtime_ns(path)
+    if mtime_ns is None:
+        return {}
+    return _read_csv_map(path, mtime_ns)
+
+
+# (колонка-ключ, колонка-значение) по имени файла; всё прочее — values/*.csv
+_CSV_MAP_COLUMNS = {
+    "attributes.map.csv": ("donor_name", "pa_slug"),
+    "categories.map.csv": ("donor_path", "woo_category_slug"),
+}
+_VALUES_MAP_COLUMNS = ("donor_value", "normalized_value")
+
+
+@lru_cache(maxsize=None)
+def _read_csv_map(path: Path, mtime_ns: int) -> Dict[str, str]:
+    # csv.reader + индексы колонок из заголовка: без dict на каждую строку и без list(reader)
+    is_values = path.name not in _CSV_MAP_COLUMNS
+    key_col, value_col = _CSV_MAP_COLUMNS.get(path.name, _VALUES_MAP_COLUMNS)
+    # utf-8-sig: карты, сохранённые из Excel, начинаются с BOM — иначе первая колонка заголовка не находится по имени
+    with path.open("r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = [h.strip() for h in next(reader, [])]
+        if key_col not in header:
+            return {}
+        ki = header.index(key_col)
+        vi = header.index(value_col) if value_col in header else None
+        pairs = (
+            (row[ki].strip() if ki < len(row) else "", row[vi].strip() if vi is not None and vi < len(row) else "")
+            for row in reader
+        )
+        # тип файла решаем один раз, а не на каждой строке
+        if is_values:
+            # values/*.csv: пустое normalized_value — оставляем значение донора
+            return {key: value or key for key, value in pairs if key}
+        return {key: value for key, value in pairs if key and value}
 
 
 def _load_values_maps(profile: str) -> Dict[str, Dict[str, str]]:
     values_dir = _profile_dir(profile) / "values"
-    value_maps: Dict[str, Dict[str, str]] = {}
-    if not values_dir.exists():
-        return value_maps
-    for p in values_dir.glob("pa_*.csv"):
-        pa_slug = p.stem
-        value_maps[pa_slug] = _load_csv_map(p)
-    return value_maps
+    return {p.stem: _load_csv_map(p) for p in _values_map_files(values_dir, _mtime_ns(values_dir))}
+
+
+def _load_values_map(profile: str, pa_slug: str) -> Dict[str, str]:
+    # товару нужна карта одного атрибута: stat одного файла вместо обхода всех values/pa_*.csv
+    return _load_csv_map(_profile_dir(profile) / "values" / f"{pa_slug}.csv")
+
+
+@lru_cache(maxsize=None)
+def _values_map_files(values_dir: Path, mtime_ns: Optional[int]) -> Tuple[Path, ...]:
+    # состав каталога меняется вместе с его mtime — glob только после добавления/удаления файлов;
+    # правки содержимого отслеживает _load_csv_map
+    if mtime_ns is None:
+        return ()
+    return tuple(values_dir.glob("pa_*.csv"))
+
+
+def _strip_artikul(sku: str) -> str:
+    # префикс якорный: match + срез вместо sub — без сборки новой строки через движок замены
+    m = _ARTIKUL_RE.match(sku)
+    return sku[m.end():] if m else sku
 
 
 def _text(el) -> str:
-    return re.sub(r"\s+", " ", el.get_text(strip=True)) if el else ""
+    # text(strip=True) уже обрезал края, так что split/join схлопывает пробелы как \s+, но без движка регулярок
+    return " ".join(el.text(strip=True).split()) if el else ""
+
+
+def _strip_title_suffix(title: str, value: str) -> str:
+    # "Гель CROOZ, 15 ml" -> "Гель CROOZ": строковые операции вместо регэкспа, собираемого на каждый товар
+    head = title.rstrip()
+    if not head.endswith(value):
+        return title
+    head = head[: len(head) - len(value)].rstrip()
+    return head[:-1] if head.endswith(",") else title
 
 
+@lru_cache(maxsize=4096)
+def _slugify_cached(text: str) -> str:
+    # названия категорий из крошек повторяются от товара к товару, а slugify (транслитерация) не бесплатен
+    return slugify(text)
+
+
+# цены повторяются (одна и та же цена у вариаций, у товаров каталога) — разбор строки кэшируем, результат неизменяемый
+@lru_cache(maxsize=1024)
 def _price_to_float(text: str) -> Optional[float]:
     if not text:
         return None
-    # Убираем все кроме цифр и разделителей
-    cleaned = re.sub(r"[^0-9,\.]+", "", text)
-    # Приводим запятую к точке, убираем лишние пробелы
-    cleaned = cleaned.replace(" ", "").replace(",", ".")
+    # Убираем все кроме цифр и разделителей (пробелы уходят тут же) и приводим запятую к точке
+    cleaned = _PRICE_STRIP_RE.sub("", text).replace(",", ".")
     try:
         return float(cleaned)
     except ValueError:
         return None
 
 
+_JSON_START_RE = re.compile(rb"\s*[\[{]")
+_PAGE_CHUNK_SIZE = 64 * 1024
+_UTF8_COMPATIBLE_CHARSETS = frozenset(("utf-8", "utf8", "ascii", "us-ascii"))
+
+
+def _json_body(resp: httpx.Response):
+    # JSON разбираем, только если на него указывает content-type или первый значимый байт тела;
+    # HTML-ответы (блок "Дивіться також" и т.п.) не гоняем через json-парсер с исключением
+    if "json" not in resp.headers.get("content-type", "") and not _JSON_START_RE.match(resp.content):
+        return None
+    try:
+        return resp.json()
+    except ValueError:
+        return None
+
+
+def _scan_ajax_json(data: Dict) -> Dict[str, object]:
+    # по каждому полю — dict.get по ключам в порядке приоритета до первого значения подходящего типа:
+    # десяток поисков в хэше, сколько бы лишних ключей ни было в ответе
+    found: Dict[str, object] = {}
+    for field, types, keys in _AJAX_JSON_FIELDS:
+        for key in keys:
+            value = data.get(key)
+            if isinstance(value, types):
+                found[field] = value
+                break
+    return found
+
+
+def _html_from_bytes(body: bytes, encoding: Optional[str]) -> LexborHTMLParser:
+    # UTF-8 страницу отдаём lexbor байтами: без декодирования в str и обратного перекодирования в UTF-8 внутри парсера;
+    # ASCII — подмножество UTF-8, его тоже не декодируем
+    if (encoding or "").lower() in _UTF8_COMPATIBLE_CHARSETS:
+        return LexborHTMLParser(body)
+    return LexborHTMLParser(body.decode(encoding or "utf-8", errors="replace"))
+
+
+def _read_capped(resp: httpx.Response, limit: int) -> bytes:
+    # тело читаем потоком с потолком: многомегабайтная/битая страница обрывается, не раздувая память до разбора
+    declared = resp.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > limit:
+        raise ValueError(f"{resp.url}: ответ {declared} байт, лимит MAX_PAGE_BYTES={limit}")
+    chunks: List[bytes] = []
+    total = 0
+    for chunk in resp.iter_bytes(_PAGE_CHUNK_SIZE):
+        total += len(chunk)
+        if total > limit:
+            raise ValueError(f"{resp.url}: ответ больше лимита MAX_PAGE_BYTES={limit}")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _fetch_html(client: httpx.Client, url: str) -> LexborHTMLParser:
+    with client.stream("GET", url, follow_redirects=True) as resp:
+        resp.raise_for_status()
+        body = _read_capped(resp, get_settings().max_page_bytes)
+        encoding = resp.encoding
+    return _html_from_bytes(body, encoding)
+
+
+@lru_cache(maxsize=64)
+def _url_origin(base: str) -> Tuple[str, str]:
+    parts = urlsplit(base)
+    return parts.scheme, parts.netloc
+
+
 def _abs_url(base: str, url: str) -> str:
+    # частые случаи без urljoin: абсолютный URL и путь от корня (схема/хост базы разбираются один раз на базу);
+    # пути с ./.. и относительные отдаём urljoin
+    if url.startswith(("https://", "http://")):
+        return url
+    if url.startswith("/") and "/." not in url:
+        scheme, netloc = _url_origin(base)
+        if scheme and netloc:
+            return f"{scheme}:{url}" if url.startswith("//") else f"{scheme}://{netloc}{url}"
     return urljoin(base, url)
 
 
+# частые варианты плейсхолдеров ("будь який" — укр. "любой"), включая "будь - який"/"будьякий"
+_PLACEHOLDER_RE = re.compile(r"будь\s*-?\s*який|any|любой", re.IGNORECASE)
+
+
+# подписи опций повторяются от товара к товару ("15 ml", "30 ml") — ответ кэшируем
+@lru_cache(maxsize=4096)
 def _is_placeholder_option(val: str) -> bool:
-    v = (val or "").strip().lower()
-    if not v:
-        return True
-    placeholders = [
-        "будь який",
-        "будь-який",
-        "any",
-        "любой",
-    ]
-    return any(p in v for p in placeholders)
+    # один проход скомпилированной альтернации по строке; подстрока, а не точное совпадение — "Будь-який обʼєм" тоже заглушка
+    return not val or not val.strip() or _PLACEHOLDER_RE.search(val) is not None
 
 
-def _normalize_value(profile: str, pa_slug: str, value: str) -> str:
-    values_map = _load_values_maps(profile)
-    mapping = values_map.get(pa_slug, {})
-    return mapping.get(value, value)
+@lru_cache(maxsize=None)
+def _donor_rate_limiter(rps: float) -> RateLimiter:
+    # общий лимитер на процесс: параллельные воркеры push-batch делят один бюджет RPS донора
+    return RateLimiter(rps)
 
 
-def scrape_product(url: str, profile: str) -> Product:
+def _http_client(settings) -> httpx.Client:
+    # HTTP/2 + пул keep-alive: вариации/страницы одного донора идут по уже открытому соединению, без нового TLS-рукопожатия.
+    # Редиректы (слэш в конце, http->https) клиент проходит сам, а не отдаёт 301 в raise_for_status
+    kwargs = dict(
+        http2=True,
+        timeout=settings.requests_timeout,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    )
+    if settings.http_cache_dir is None:
+        return httpx.Client(**kwargs)
+    # дисковый кэш GET-ответов (страницы, листинги, AJAX вариаций по URL+params): повторные прогоны не ходят к донору.
+    # force_cache — донор обычно отдаёт no-cache, поэтому свежесть определяет только HTTP_CACHE_TTL
+    import hishel
+    return hishel.CacheClient(
+        storage=hishel.FileStorage(base_path=settings.http_cache_dir, ttl=settings.http_cache_ttl),
+        controller=hishel.Controller(cacheable_methods=["GET"], force_cache=True),
+        **kwargs,
+    )
+
+
+def _debug_dir() -> Path:
+    return _ensure_dir(_workspace_root() / "debug")
+
+
+@lru_cache(maxsize=8)
+def _ensure_dir(path: Path) -> Path:
+    # каталог создаём один раз на процесс (ключ — путь: корень зависит от cwd)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _debug_http_client() -> httpx.Client:
+    # debug-команды гоняют одну и ту же страницу по кругу: с DEBUG_HTTP_CACHE повторный запуск — только разбор, без сети
+    settings = get_settings()
+    if settings.debug_http_cache and settings.http_cache_dir is None:
+        settings = replace(settings, http_cache_dir=_debug_dir() / "httpcache")
+    return _http_client(settings)
+
+
+def _page_fingerprint(url: str, client: httpx.Client) -> Optional[str]:
+    # дешёвый отпечаток страницы по заголовкам HEAD (ETag/Last-Modified), без скачивания и парсинга тела
+    if url == FIXTURE_URL:
+        return None
+    try:
+        _donor_rate_limiter(get_settings().rate_limit_rps).wait()
+        resp = client.head(url, follow_redirects=True)
+    except httpx.HTTPError:
+        return None
+    if resp.status_code >= 400:
+        return None
+    return resp.headers.get("etag") or resp.headers.get("last-modified")
+
+
+def scrape_product(url: str, profile: str, client: Optional[httpx.Client] = None) -> Product:
+    # client можно передать снаружи (push-batch), чтобы переиспользовать соединения между товарами
+    if client is None:
+        with _http_client(get_settings()) as own_client:
+            return _scrape_product(url, profile, own_client)
+    return _scrape_product(url, profile, client)
+
+
+def _sanitize_html_fragment(container: Optional[LexborNode]) -> str:
+    if not container:
+        return ""
+    # один обход: style/script — удалить, <font> — развернуть, inline style — снять;
+    # пустые <p> (только переносы/пробелы/комментарии) проверяем в конце, когда их содержимое уже вычищено.
+    # Узел, подходящий под несколько селекторов, приходит несколько раз подряд — схлопываем по mem_id
+    nodes = {n.mem_id: n for n in container.css("style, script, font, [style], p")}
+    paragraphs: List[LexborNode] = []
+    for t in nodes.values():
+        tag = t.tag
+        if tag in ("style", "script"):
+            t.decompose()
+            continue
+        if tag == "font":
+            t.unwrap()
+            continue
+        if "style" in t.attrs:
+            del t.attrs["style"]
+        if tag == "p":
+            paragraphs.append(t)
+    for p in paragraphs:
+        if _is_empty_paragraph(p):
+            p.decompose()
+    return container.inner_html or ""
+
+
+def _is_empty_paragraph(p: LexborNode) -> bool:
+    # только прямые дети и выход на первом значимом: любой элемент кроме <br> или непустой текст.
+    # Не собираем весь текст абзаца через p.text(), как раньше
+    for ch in p.iter(include_text=True):
+        tag = ch.tag
+        if tag == "-text":
+            if ch.text_content.strip():
+                return False
+        elif tag not in ("-comment", "br"):
+            return False
+    return True
+
+
+def _scrape_product(url: str, profile: str, client: httpx.Client) -> Product:
     # Фикстура для теста интеграции
     if url == FIXTURE_URL:
         return Product(
@@ -139,28 +423,27 @@ def scrape_product(url: str, profile: str) -> Product:
 
     manifest = _load_manifest(profile)
     settings = get_settings()
-    rate = RateLimiter(settings.rate_limit_rps)
+    rate = _donor_rate_limiter(settings.rate_limit_rps)
 
     rate.wait()
-    with httpx.Client(timeout=settings.requests_timeout) as client:
-        resp = client.get(url)
-        resp.raise_for_status()
-        html = resp.text
-
-    soup = BeautifulSoup(html, "lxml")
+    tree = _fetch_html(client, url)
     site_base = manifest.get("site", {}).get("base_url", "")
 
-    sel = manifest.get("product", {}).get("selectors", {})
-    title = _text(soup.select_one(sel.get("title", "")))
-    sku = _text(soup.select_one(sel.get("sku", "")))
+    sel = _product_selectors(profile)
+    # селекторы цен/артикула нужны и для страницы товара, и для каждой вариации — держим их локально
+    sale_price_sel = sel["price_sale"]
+    regular_price_sel = sel["price_regular"]
+    sku_sel = sel["sku"]
+    title = _text(_css_first(tree, sel["title"]))
+    sku = _text(_css_first(tree, sku_sel))
     if sku:
         # убрать префикс "Артикул: " если присутствует
-        sku_clean = re.sub(r"^\s*Артикул\s*:\s*", "", sku, flags=re.IGNORECASE)
+        sku_clean = _strip_artikul(sku)
         sku = sku_clean or sku
 
-    sale_el = soup.select_one(sel.get("price_sale", "")) if sel.get("price_sale") else None
-    reg_el = soup.select_one(sel.get("price_regular", "")) if sel.get("price_regular") else None
-    generic_el = soup.select_one(".product-price__item")
+    sale_el = _css_first(tree, sale_price_sel)
+    reg_el = _css_first(tree, regular_price_sel)
+    generic_el = tree.css_first(_GENERIC_PRICE_SEL)
     sale_price = _price_to_float(_text(sale_el)) if sale_el else None
     regular_from_old = _price_to_float(_text(reg_el)) if reg_el else None
     generic_price = _price_to_float(_text(generic_el)) if generic_el else None
@@ -172,51 +455,23 @@ def scrape_product(url: str, profile: str) -> Product:
     if regular_price is None and generic_price is not None:
         regular_price = generic_price
 
-    desc_el = soup.select_one(sel.get("description_html", ""))
-
-    def _sanitize_html_fragment(container: Optional[Tag]) -> str:
-        if not container:
-            return ""
-        # удалить style/script
-        for t in container.find_all(["style", "script"]):
-            t.decompose()
-        # развернуть теги <font>
-        for t in list(container.find_all("font")):
-            t.unwrap()
-        # удалить inline style-атрибуты
-        for t in container.find_all(True):
-            if "style" in t.attrs:
-                del t["style"]
-        # удалить пустые <p> (только переносы/пробелы)
-        for p in list(container.find_all("p")):
-            text = p.get_text(strip=True)
-            if not text:
-                has_meaningful_child = any(getattr(ch, "name", None) not in (None, "br") for ch in p.children)
-                if not has_meaningful_child:
-                    p.decompose()
-        return container.decode_contents()
+    desc_el = _css_first(tree, sel["description_html"])
 
     description_html = _sanitize_html_fragment(desc_el)
 
-    # Галерея
-    images: List[Image] = []
-    gal_selector = sel.get("gallery_imgs")
+    # Галерея: дубли по URL отсекаем сразу, dict сохраняет порядок первого появления
+    images_by_url: Dict[str, Image] = {}
+    gal_selector = sel["gallery_imgs"]
     if gal_selector:
-        for img in soup.select(gal_selector):
-            src = (img.get("src") or "").strip()
-            alt = (img.get("alt") or "").strip() or title
+        for img in tree.css(gal_selector):
+            src = (img.attributes.get("src") or "").strip()
             if not src:
                 continue
             full = _abs_url(site_base or url, src)
-            images.append(Image(url=full, alt=alt))
-    # Убираем дубли, сохраняя порядок
-    seen: set = set()
-    unique_images: List[Image] = []
-    for im in images:
-        if im.url not in seen:
-            unique_images.append(im)
-            seen.add(im.url)
-    images = unique_images
+            if full not in images_by_url:
+                alt = (img.attributes.get("alt") or "").strip() or title
+                images_by_url[full] = Image.model_construct(url=full, alt=alt)
+    images = list(images_by_url.values())
 
     # Вариации/атрибуты
     attributes: Dict[str, List[str]] = {}
@@ -225,82 +480,65 @@ def scrape_product(url: str, profile: str) -> Product:
 
     # Собираем кнопки вариаций
     active_sel = manifest.get("variations", {}).get("active_selector")
-    obem_buttons = soup.select(".product__modifications .modification .modification__body .modification__list .modification__button")
-    values_map = _load_values_maps(profile)
-    attr_map = _load_csv_map(_profile_dir(profile) / "attributes.map.csv")
-
-    def _normalize(pa_slug: str, value: str) -> str:
-        m = values_map.get(pa_slug, {})
-        return m.get(value, value)
-
-    def _is_placeholder_option(val: str) -> bool:
-        v = (val or "").strip().lower()
-        if not v:
-            return True
-        # частые варианты плейсхолдеров
-        placeholders = [
-            "будь який",  # укр. "любой"
-            "будь-який",
-            "any",
-            "любой",
-        ]
-        return any(p in v for p in placeholders)
-
+    obem_buttons = tree.css(_OPTION_BUTTONS_SEL)
     variations_data: List[Variation] = []
     if obem_buttons:
-        raw_values = [_text(b) for b in obem_buttons]
-        raw_values = [v for v in raw_values if not _is_placeholder_option(v)]
-        # уникализируем порядок
-        _seen = set()
-        raw_values = [v for v in raw_values if not (v in _seen or _seen.add(v))]
-        pa_slug = attr_map.get("Обʼєм", "pa_obyem")
-        norm_values = [_normalize(pa_slug, v) for v in raw_values if v]
+        pa_slug = _load_csv_map(_profile_dir(profile) / "attributes.map.csv").get("Обʼєм", "pa_obyem")
+        # карта значений атрибута нужна только товарам с вариациями: берём её один раз
+        pa_values = _load_values_map(profile, pa_slug)
+        # текст кнопок, отсев плейсхолдеров и нормализация подписи — один раз на кнопку;
+        # ниже переиспользуем для href- и ajax-карт
+        option_buttons = [
+            (b, label, pa_values.get(label, label))
+            for b, label in zip(obem_buttons, map(_text, obem_buttons))
+            if not _is_placeholder_option(label)
+        ]
+        # уникализируем уже нормализованные значения, сохраняя порядок: две подписи донора с одним значением Woo не дублируются
+        norm_values = list(dict.fromkeys(norm_label for _, label, norm_label in option_buttons if label))
         if norm_values:
             attributes[pa_slug] = norm_values
         if len(norm_values) > 1:
             product_type = "variable"
         # дефолт из активной кнопки
         if active_sel:
-            active = soup.select_one(active_sel)
+            active = tree.css_first(active_sel)
             if active:
-                active_val = _normalize(pa_slug, _text(active))
+                active_label = _text(active)
+                active_val = pa_values.get(active_label, active_label)
                 if active_val:
                     default_attributes[pa_slug] = active_val
                     # если в конце заголовка после запятой стоит активное значение вариации — уберём его
                     if title:
-                        pattern = r",\s*" + re.escape(active_val) + r"\s*$"
-                        title = re.sub(pattern, "", title)
+                        title = _strip_title_suffix(title, active_val)
 
         # Вариант 1 (быстрый): если у кнопок есть href на страницы вариаций — используем их, без Playwright
         # Строим соответствие нормализованная метка -> абсолютный href
         value_to_href: Dict[str, str] = {}
-        for b in obem_buttons:
-            label = _text(b)
-            if _is_placeholder_option(label):
-                continue
-            href = (b.get("href") or "").strip()
+        for b, _, norm_label in option_buttons:
+            href = (b.attributes.get("href") or "").strip()
             if not href:
                 continue
             href_abs = _abs_url(site_base or url, href)
-            norm_label = _normalize(pa_slug, label)
             if norm_label and href_abs:
                 value_to_href[norm_label] = href_abs
 
-        if not variations_data and value_to_href and len(set(value_to_href.values())) >= 1 and product_type == "variable":
+        if not variations_data and value_to_href and product_type == "variable":
+            variant_hrefs = [(opt, value_to_href[opt]) for opt in attributes.get(pa_slug, []) if value_to_href.get(opt)]
+
+            def _fetch_variant_page(href: str) -> LexborHTMLParser:
+                rate.wait()
+                return _fetch_html(client, href)
+
+            # страницы вариаций качаем и разбираем параллельно (как и ajax ниже), собираем в исходном порядке
+            with ThreadPoolExecutor(max_workers=max(1, min(settings.variation_workers, len(variant_hrefs)))) as pool:
+                page_futures = [pool.submit(_fetch_variant_page, href) for _, href in variant_hrefs]
             tmp_vars_url: List[Variation] = []
-            for opt in attributes.get(pa_slug, []):
-                href = value_to_href.get(opt)
-                if not href:
-                    continue
+            for (opt, href), fut in zip(variant_hrefs, page_futures):
                 try:
-                    rate.wait()
-                    with httpx.Client(timeout=settings.requests_timeout, follow_redirects=True) as sclient:
-                        rvar = sclient.get(href)
-                        rvar.raise_for_status()
-                        vsoup = BeautifulSoup(rvar.text, "lxml")
+                    vtree = fut.result()
                     # цена: сначала скидочная, затем обычная
-                    v_sale_el = vsoup.select_one(sel.get("price_sale", "")) if sel.get("price_sale") else None
-                    v_reg_el = vsoup.select_one(sel.get("price_regular", "")) if sel.get("price_regular") else None
+                    v_sale_el = _css_first(vtree, sale_price_sel)
+                    v_reg_el = _css_first(vtree, regular_price_sel)
                     vprice = None
                     if v_sale_el:
                         vprice = _price_to_float(_text(v_sale_el))
@@ -308,17 +546,17 @@ def scrape_product(url: str, profile: str) -> Product:
                         vprice = _price_to_float(_text(v_reg_el))
                     # sku
                     vsku = None
-                    vsku_el = vsoup.select_one(sel.get("sku", "")) if sel.get("sku") else None
+                    vsku_el = _css_first(vtree, sku_sel)
                     if vsku_el:
                         sk = _text(vsku_el)
                         if sk:
-                            vsku = re.sub(r"^\s*Артикул\s*:\s*", "", sk, flags=re.IGNORECASE)
+                            vsku = _strip_artikul(sk)
                     # главное изображение
-                    img0 = vsoup.select_one(".gallery__photos .gallery__item:first-child .gallery__photo-img")
+                    img0 = vtree.css_first(_GALLERY_FIRST_IMG_SEL)
                     vimg_url = None
-                    if img0 and img0.get("src"):
-                        vimg_url = _abs_url(site_base or href, img0.get("src"))
-                    tmp_vars_url.append(Variation(
+                    if img0 and img0.attributes.get("src"):
+                        vimg_url = _abs_url(site_base or href, img0.attributes.get("src"))
+                    tmp_vars_url.append(Variation.model_construct(
                         sku=vsku or "",
                         regular_price=(vprice if vprice is not None else (regular_price or 0.0)),
                         sale_price=None,
@@ -327,7 +565,7 @@ def scrape_product(url: str, profile: str) -> Product:
                         image_url=vimg_url,
                     ))
                 except Exception:
-                    tmp_vars_url.append(Variation(
+                    tmp_vars_url.append(Variation.model_construct(
                         sku="",
                         regular_price=(regular_price or 0.0),
                         sale_price=None,
@@ -345,86 +583,91 @@ def scrape_product(url: str, profile: str) -> Product:
                     variations_data = tmp_vars_url
 
         # Попытаться собрать данные по вариациям через ajax-эндпоинт формы
-        form = soup.select_one(".product__modifications form[method=post]")
+        form = tree.css_first(_MODIFICATIONS_FORM_SEL)
         if form is not None:
-            action = (form.get("data-action") or form.get("action") or "").strip()
+            action = (form.attributes.get("data-action") or form.attributes.get("action") or "").strip()
             if action:
                 action_url = _abs_url(site_base or url, action)
-                hidden = form.select_one("input[name^=\"param[\"]")
-                param_name = hidden.get("name") if hidden else "param[obem]"
+                hidden = form.css_first(_PARAM_INPUT_SEL)
+                param_name = hidden.attributes.get("name") if hidden else "param[obem]"
                 # построим карту значение -> подпись
-                value_to_label: Dict[str, str] = {}
-                for b in obem_buttons:
-                    label = _text(b)
-                    if _is_placeholder_option(label):
-                        continue
-                    val = (b.get("data-value") or "").strip()
-                    if val:
-                        value_to_label[val] = _normalize(pa_slug, label)
-                ajax_hashes: Dict[str, str] = {}
-                tmp_vars: List[Variation] = []
-                for val, label in value_to_label.items():
-                    try:
+                value_to_label: Dict[str, str] = {
+                    val: norm_label
+                    for b, _, norm_label in option_buttons
+                    for val in ((b.attributes.get("data-value") or "").strip(),)
+                    if val
+                }
+                ajax_headers = {
+                    "Referer": url,
+                    "X-Requested-With": "XMLHttpRequest",
+                    "Accept": "application/json,text/html,*/*",
+                    "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+                }
+
+                def _fetch_ajax(val: str) -> httpx.Response:
+                    rate.wait()
+                    # сначала попробуем GET, как это часто делает фронтенд
+                    r = client.get(action_url, params={param_name: val}, headers=ajax_headers, follow_redirects=True)
+                    if r.status_code >= 400:
+                        # fallback на POST — отдельный запрос к донору, тоже через лимитер
                         rate.wait()
-                        ajax_headers = {
-                            "Referer": url,
-                            "X-Requested-With": "XMLHttpRequest",
-                            "Accept": "application/json,text/html,*/*",
-                            "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-                        }
-                        with httpx.Client(timeout=settings.requests_timeout, headers=ajax_headers, follow_redirects=True) as sclient:
-                            # сначала попробуем GET, как это часто делает фронтенд
-                            r = sclient.get(action_url, params={param_name: val})
-                            if r.status_code >= 400:
-                                # fallback на POST
-                                r = sclient.post(action_url, data={param_name: val})
-                        r.raise_for_status()
-                        # сохраняем хэш ответа для детекции "одинакового контента"
-                        try:
-                            ajax_hashes[val] = hashlib.md5(r.text.encode("utf-8", errors="ignore")).hexdigest()
-                        except Exception:
-                            ajax_hashes[val] = ""
-                        # сначала пробыем как JSON
+                        r = client.post(action_url, data={param_name: val}, headers=ajax_headers, follow_redirects=True)
+                    r.raise_for_status()
+                    return r
+
+                # запросы по вариациям независимы: шлём их параллельно (RPS по-прежнему держит общий лимитер),
+                # разбираем ответы ниже в исходном порядке
+                with ThreadPoolExecutor(max_workers=max(1, min(settings.variation_workers, len(value_to_label)))) as pool:
+                    ajax_futures = [pool.submit(_fetch_ajax, val) for val in value_to_label]
+                ajax_responses: List[Optional[httpx.Response]] = []
+                for fut in ajax_futures:
+                    try:
+                        ajax_responses.append(fut.result())
+                    except Exception:
+                        ajax_responses.append(None)
+                # детекция "одинакового контента": прямое сравнение байтов без хэширования — разная длина отсекается сразу,
+                # одинаковая сравнивается memcmp, результат точный
+                bodies = [r.content for r in ajax_responses if r is not None]
+                ajax_identical = bool(bodies) and bodies.count(bodies[0]) == len(bodies)
+                tmp_vars: List[Variation] = []
+                # Если все ajax ответы идентичны (страница та же), данным не доверяем и сразу переходим к URL/Playwright фолбэкам,
+                # не разбирая одинаковые ответы
+                if not ajax_identical:
+                    for label, r in zip(value_to_label.values(), ajax_responses):
                         var_sku: Optional[str] = None
                         var_price: Optional[float] = None
                         var_image_url: Optional[str] = None
-                        parsed_json = None
+                        # если ajax не сработал, вариация получит дефолтную цену и останется без изображения
                         try:
-                            parsed_json = r.json()
+                            # сначала пробыем как JSON
+                            parsed_json = _json_body(r) if r is not None else None
+                            if isinstance(parsed_json, dict):
+                                # эвристики по ключам
+                                fields = _scan_ajax_json(parsed_json)
+                                if "price" in fields:
+                                    var_price = _price_to_float(str(fields["price"]))
+                                if "sku" in fields:
+                                    var_sku = fields["sku"].strip() or None
+                                if "image" in fields:
+                                    var_image_url = _abs_url(site_base or url, fields["image"])
+                                # иногда бывает html
+                                if not (var_price and var_image_url):
+                                    html_fragment = parsed_json.get("html") or parsed_json.get("content")
+                                    if isinstance(html_fragment, str) and html_fragment:
+                                        frag = LexborHTMLParser(html_fragment)
+                                        if not var_price:
+                                            el = _css_first(frag, sale_price_sel) or _css_first(frag, regular_price_sel)
+                                            var_price = _price_to_float(_text(el)) if el else None
+                                        if not var_image_url:
+                                            img0 = frag.css_first(_GALLERY_FIRST_IMG_SEL)
+                                            if img0 and img0.attributes.get("src"):
+                                                var_image_url = _abs_url(site_base or url, img0.attributes.get("src"))
+                            # HTML фрагмент: сайт отдаёт блок "Дивіться також" и т.п., не содержит данных вариаций —
+                            # оставляем None, чтобы fallback ниже заполнил данными
                         except Exception:
-                            parsed_json = None
-                        if isinstance(parsed_json, dict):
-                            # эвристики по ключам
-                            for key in ("price", "regular_price", "price_html", "new_price"):
-                                if key in parsed_json and isinstance(parsed_json[key], (str, int, float)):
-                                    var_price = _price_to_float(str(parsed_json[key]))
-                                    break
-                            for key in ("sku", "article", "code"):
-                                if key in parsed_json and isinstance(parsed_json[key], str):
-                                    var_sku = parsed_json[key].strip() or None
-                                    break
-                            for key in ("image", "image_url", "img"):
-                                if key in parsed_json and isinstance(parsed_json[key], str):
-                                    var_image_url = _abs_url(site_base or url, parsed_json[key])
-                                    break
-                            # иногда бывает html
-                            if not (var_price and var_image_url):
-                                html_fragment = parsed_json.get("html") or parsed_json.get("content")
-                                if isinstance(html_fragment, str) and html_fragment:
-                                    frag = BeautifulSoup(html_fragment, "lxml")
-                                    if not var_price:
-                                        el = frag.select_one(sel.get("price_sale", "")) or frag.select_one(sel.get("price_regular", ""))
-                                        var_price = _price_to_float(_text(el)) if el else None
-                                    if not var_image_url:
-                                        img0 = frag.select_one(".gallery__photos .gallery__item:first-child .gallery__photo-img")
-                                        if img0 and img0.get("src"):
-                                            var_image_url = _abs_url(site_base or url, img0.get("src"))
-                        else:
-                            # HTML фрагмент: сайт отдаёт блок "Дивіться також" и т.п., не содержит данных вариаций
-                            # сохраняем None, чтобы fallback ниже заполнил данными
-                            pass
+                            var_sku, var_price, var_image_url = None, None, None
 
-                        tmp_vars.append(Variation(
+                        tmp_vars.append(Variation.model_construct(
                             sku=var_sku or "",
                             regular_price=var_price or (regular_price or 0.0),
                             sale_price=None,
@@ -432,21 +675,8 @@ def scrape_product(url: str, profile: str) -> Product:
                             attributes={pa_slug: label},
                             image_url=var_image_url,
                         ))
-                    except Exception:
-                        # если ajax не сработал, создадим вариацию с дефолтной ценой и без изображения
-                        tmp_vars.append(Variation(
-                            sku="",
-                            regular_price=(regular_price or 0.0),
-                            sale_price=None,
-                            stock_quantity=None,
-                            attributes={pa_slug: label},
-                            image_url=None,
-                        ))
         # конец ajax-зоны
 
-                # Если все ajax ответы идентичны (страница та же), не доверяем данным и переходим к URL/Playwright фолбэкам
-                if ajax_hashes and len(set(ajax_hashes.values())) == 1:
-                    tmp_vars = []
                 # Если ajax дал только базовые значения без отличий (цена=база, пустые sku/img) для всех опций — считаем, что не удалось
                 if tmp_vars:
                     any_specific = any(
@@ -461,44 +691,48 @@ def scrape_product(url: str, profile: str) -> Product:
         if not variations_data and norm_values:
             try:
                 from playwright.sync_api import sync_playwright
-                headless = get_settings().headless
+                headless = settings.headless
                 option_selector = manifest.get("variations", {}).get("columns", {}).get("size") or ".modification__body .modification__list .modification__button"
-                regular_price_sel = sel.get("price_regular")
-                sale_price_sel = sel.get("price_sale")
                 # для ожидания изменения цены используем sale или общий видимый прайс
-                price_selectors = [s for s in [sale_price_sel, ".product-price__item"] if s]
-                sku_sel = sel.get("sku")
+                price_selectors = [s for s in [sale_price_sel, _GENERIC_PRICE_SEL] if s]
                 with sync_playwright() as p:
                     browser = p.chromium.launch(headless=headless)
-                    page = browser.new_page()
+                    # картинки/шрифты/медиа для чтения цены и SKU не нужны — DOM готов быстрее.
+                    # CSS не режем: от него зависит innerText скрытых блоков цены
+                    context = browser.new_context()
+                    context.route(
+                        "**/*",
+                        lambda route: route.abort() if route.request.resource_type in _PW_BLOCKED_RESOURCES else route.continue_(),
+                    )
+                    page = context.new_page()
                     page.goto(url, wait_until="domcontentloaded")
                     # имя свойства (например, obem)
                     prop_el = page.query_selector('.modification input[type="hidden"][data-prop]')
                     prop = prop_el.get_attribute('data-prop') if prop_el else None
-                    # собрать значения опций
-                    btns = page.query_selector_all(option_selector)
-                    values = []
+                    # собрать значения опций: подписи и data-value всех кнопок одним round-trip в браузер,
+                    # а не inner_text + get_attribute на каждую кнопку
+                    options = page.eval_on_selector_all(
+                        option_selector,
+                        "els => els.map(e => [(e.innerText || '').trim(), e.getAttribute('data-value') || ''])",
+                    )
                     labels_for_value: Dict[str, str] = {}
-                    for b in btns:
-                        txt = (b.inner_text() or "").strip()
-                        if _is_placeholder_option(txt):
-                            continue
-                        v = b.get_attribute('data-value') or ''
-                        if v and v not in values:
-                            values.append(v)
+                    for txt, v in options:
+                        if v and v not in labels_for_value and not _is_placeholder_option(txt):
                             labels_for_value[v] = txt
-                    for v in values:
-                        label = labels_for_value.get(v, v)
+                    for v, label in labels_for_value.items():
                         # смена вариации через hidden input + событие change
                         href_before = page.url
-                        # зафиксировать текущее значение цены для ожидания изменения
-                        before_prices = []
-                        for ps in price_selectors:
-                            try:
-                                txt = page.text_content(ps) or ""
-                            except Exception:
-                                txt = ""
-                            before_prices.append([ps, txt.strip()])
+                        # зафиксировать текущее значение цены для ожидания изменения — все селекторы одним evaluate
+                        before_prices = page.evaluate(
+                            """
+                            (sels) => sels.map((sel) => {
+                              let el = null;
+                              try { el = document.querySelector(sel); } catch (e) {}
+                              return [sel, el ? (el.textContent || '').trim() : ''];
+                            })
+                            """,
+                            price_selectors,
+                        )
 
                         # сначала пробуем клик по кнопке вариации
                         btn = page.query_selector(f"{option_selector}[data-value=\"{v}\"]")
@@ -526,72 +760,55 @@ def scrape_product(url: str, profile: str) -> Product:
                                 [prop, v]
                             )
 
-                        # ждём смену URL или изменение текста цены
-                        changed = False
-                        for _ in range(20):
-                            page.wait_for_timeout(150)
-                            if page.url != href_before:
-                                changed = True
-                                break
-                            try:
-                                cond = page.evaluate(
-                                    """
-                                    (arr) => {
-                                      for (const [sel, before] of arr) {
-                                        const el = document.querySelector(sel);
-                                        if (el) {
-                                          const now = (el.innerText || '').trim();
-                                          if (now && now !== (before || '')) return true;
-                                        }
-                                      }
-                                      return false;
+                        # ждём смену URL или изменение текста цены: проверка в браузере на каждом кадре вместо опроса из Python
+                        try:
+                            page.wait_for_function(
+                                """
+                                ([href, arr]) => {
+                                  if (location.href !== href) return true;
+                                  for (const [sel, before] of arr) {
+                                    const el = document.querySelector(sel);
+                                    if (el) {
+                                      const now = (el.innerText || '').trim();
+                                      if (now && now !== (before || '')) return true;
                                     }
-                                    """,
-                                    before_prices
-                                )
-                                if cond:
-                                    changed = True
-                                    break
-                            except Exception:
-                                pass
+                                  }
+                                  return false;
+                                }
+                                """,
+                                arg=[href_before, before_prices],
+                                timeout=3000,
+                            )
+                        except Exception:
+                            # таймаут (цена не меняется) или навигация на страницу вариации — читаем то, что есть
+                            pass
                         # дополнительная пауза на ajax
                         page.wait_for_timeout(300)
 
-                        # считаем цены вариации
-                        vprice_sale = None
-                        if sale_price_sel:
-                            el = page.query_selector(sale_price_sel)
-                            if el:
-                                vprice_sale = _price_to_float((el.inner_text() or "").strip())
+                        # все поля вариации — одним evaluate (один round-trip в браузер вместо запроса на каждый элемент);
+                        # старая цена только для справки и не читается
+                        dom = page.evaluate(
+                            """
+                            ([saleSel, genericSel, skuSel, imgSel]) => {
+                              const text = (sel) => {
+                                const el = sel && document.querySelector(sel);
+                                return el ? (el.innerText || '').trim() : null;
+                              };
+                              const img = document.querySelector(imgSel);
+                              return {sale: text(saleSel), generic: text(genericSel), sku: text(skuSel), img: img ? img.getAttribute('src') : null};
+                            }
+                            """,
+                            [sale_price_sel, _GENERIC_PRICE_SEL, sku_sel, _GALLERY_FIRST_IMG_SEL],
+                        )
+                        vprice_sale = _price_to_float(dom["sale"]) if dom["sale"] else None
                         # общий текущий прайс (видимый), если нет скидки
-                        vprice_generic = None
-                        gel = page.query_selector(".product-price__item")
-                        if gel:
-                            vprice_generic = _price_to_float((gel.inner_text() or "").strip())
-                        # старая цена (для справки, не используем как текущую)
-                        vprice_old = None
-                        old_sel = regular_price_sel if regular_price_sel else ".product-price__old-price"
-                        if old_sel:
-                            oel = page.query_selector(old_sel)
-                            if oel:
-                                vprice_old = _price_to_float((oel.inner_text() or "").strip())
+                        vprice_generic = _price_to_float(dom["generic"]) if dom["generic"] else None
                         # эффективная текущая цена вариации: скидка если есть, иначе видимый прайс
                         vprice_effective = vprice_sale if (vprice_sale is not None) else vprice_generic
-                        vsku = None
-                        if sku_sel:
-                            se = page.query_selector(sku_sel)
-                            if se:
-                                sk = (se.inner_text() or "").strip()
-                                if sk:
-                                    vsku = re.sub(r"^\s*Артикул\s*:\s*", "", sk, flags=re.IGNORECASE)
-                        img0 = page.query_selector(".gallery__photos .gallery__item:first-child .gallery__photo-img")
-                        vimg_url = None
-                        if img0:
-                            src = img0.get_attribute("src")
-                            if src:
-                                vimg_url = _abs_url(site_base or url, src)
-                        label_norm = _normalize(pa_slug, label)
-                        variations_data.append(Variation(
+                        vsku = _strip_artikul(dom["sku"]) if dom["sku"] else None
+                        vimg_url = _abs_url(site_base or url, dom["img"]) if dom["img"] else None
+                        label_norm = pa_values.get(label, label)
+                        variations_data.append(Variation.model_construct(
                             sku=vsku or "",
                             regular_price=(vprice_effective if (vprice_effective is not None) else (regular_price or 0.0)),
                             sale_price=(vprice_sale if (vprice_sale is not None) else None),
@@ -605,30 +822,24 @@ def scrape_product(url: str, profile: str) -> Product:
         # конец ajax-зоны
 
     # Категории по крошкам
-    categories: List[str] = []
-    category_names: List[str] = []
+    cat_slugs: Dict[str, str] = {}
     cat_map = _load_csv_map(_profile_dir(profile) / "categories.map.csv")
     bc_sel = manifest.get("categories", {}).get("breadcrumbs_selector")
     name_sel = manifest.get("categories", {}).get("breadcrumbs_name_selector")
     exclude_names = set(manifest.get("categories", {}).get("breadcrumbs_exclude_names", []) or [])
     if bc_sel:
-        crumbs = soup.select(bc_sel) or []
-        names: List[str] = []
-        for c in crumbs:
-            name_el = c.select_one(name_sel) if name_sel else None
-            name = _text(name_el or c)
-            if not name:
-                continue
-            names.append(name)
-        # отфильтровать служебные и последний (товар)
-        names = [n for n in names if n not in exclude_names]
-        if names:
-            names = names[:-1]  # убрать последний элемент – название товара
+        # имя ищем в каждой крошке отдельно: крошка без элемента-имени (обычно последняя, сам товар) берётся целиком,
+        # иначе [:-1] ниже срезал бы последнюю настоящую категорию
+        names = [_text((c.css_first(name_sel) if name_sel else None) or c) for c in tree.css(bc_sel)]
+        # отфильтровать пустые и служебные, последний (товар) убрать
+        names = [n for n in names if n and n not in exclude_names][:-1]
+        # slug -> имя крошки: порядок и дедуп за один проход, без поиска по списку
         for n in names:
-            slug = cat_map.get(n) or slugify(n)
-            if slug and slug not in categories:
-                categories.append(slug)
-                category_names.append(n)
+            slug = cat_map.get(n) or _slugify_cached(n)
+            if slug and slug not in cat_slugs:
+                cat_slugs[slug] = n
+    categories = list(cat_slugs)
+    category_names = list(cat_slugs.values())
 
     # Бренд CROOZ
     attributes.setdefault("pa_brand", ["CROOZ"])  # всегда CROOZ
@@ -656,107 +867,193 @@ def scrape_product(url: str, profile: str) -> Product:
 
 
 def _external_id_from_url(url: str) -> str:
-    # Используем последний сегмент без завершающего слеша
-    u = url.rstrip("/")
-    return u.rsplit("/", 1)[-1]
-
-
-def collect_category_urls(category_url: str, profile: str, limit: int = 20, offset: int = 0, max_pages: Optional[int] = None) -> List[str]:
+    # Используем последний сегмент без завершающего слеша; rpartition — без промежуточного списка
+    return url.rstrip("/").rpartition("/")[2]
+
+
+def collect_category_urls(category_url: str, profile: str, max_pages: Optional[int] = None, client: Optional[httpx.Client] = None) -> Iterator[str]:
+    # генератор: следующую страницу запрашиваем, только когда потребитель дочитал текущую;
+    # offset/limit вызывающий накладывает через itertools.islice
+    if client is None:
+        with _http_client(get_settings()) as own_client:
+            yield from _collect_category_urls(category_url, profile, max_pages, own_client)
+        return
+    yield from _collect_category_urls(category_url, profile, max_pages, client)
+
+
+def _collect_category_urls(
+    category_url: str,
+    profile: str,
+    max_pages: Optional[int],
+    client: httpx.Client,
+    on_first_page: Optional[Callable[[LexborHTMLParser], None]] = None,
+) -> Iterator[str]:
     manifest = _load_manifest(profile)
     settings = get_settings()
-    rate = RateLimiter(settings.rate_limit_rps)
+    rate = _donor_rate_limiter(settings.rate_limit_rps)
 
     product_sel = manifest.get("listing", {}).get("product_link") or "a"
-    next_sel = manifest.get("listing", {}).get("pagination", {}).get("next_selector")
+    pagination = manifest.get("listing", {}).get("pagination", {})
+    next_sel = pagination.get("next_selector")
 
-    results: List[str] = []
+    def _fetch(page_url: str) -> LexborHTMLParser:
+        rate.wait()
+        return _fetch_html(client, page_url)
+
+    if pagination.get("type") == "param" and pagination.get("param_name"):
+        yield from _collect_param_pages(
+            category_url, pagination["param_name"], product_sel, manifest.get("site", {}).get("base_url", category_url),
+            max_pages, _fetch, settings.variation_workers, on_first_page,
+        )
+        return
+
+    # конвейер: ссылку на следующую страницу берём до разбора товаров и сразу запускаем её загрузку,
+    # так сеть следующей страницы перекрывается с разбором и записью текущей
+    pool = ThreadPoolExecutor(max_workers=1)
     url = category_url
+    pending = pool.submit(_fetch, url)
     pages = 0
-    while len(results) < (offset + limit) and url:
-        rate.wait()
-        with httpx.Client(timeout=settings.requests_timeout) as client:
-            resp = client.get(url)
-            resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "lxml")
-        site_base = manifest.get("site", {}).get("base_url", url)
-        for a in soup.select(product_sel):
-            href = a.get("href")
-            if not href:
-                continue
-            full = _abs_url(site_base, href)
-            results.append(full)
-            if len(results) >= (offset + limit):
-                break
-        pages += 1
-        if max_pages is not None and pages >= max_pages:
-            break
-        if next_sel:
-            next_a = soup.select_one(next_sel)
-            url = _abs_url(site_base, next_a.get("href")) if next_a and next_a.get("href") else None
-        else:
-            break
-    return results[offset : offset + limit]
-
-
-def collect_all_product_urls(profile: str, limit_per_category: int = 1000) -> List[str]:
+    try:
+        while pending is not None:
+            tree = pending.result()
+            pending = None
+            site_base = manifest.get("site", {}).get("base_url", url)
+            pages += 1
+            if pages == 1 and on_first_page is not None:
+                on_first_page(tree)
+            if next_sel and (max_pages is None or pages < max_pages):
+                next_a = tree.css_first(next_sel)
+                href = next_a.attributes.get("href") if next_a else None
+                if href:
+                    url = _abs_url(site_base, href)
+                    pending = pool.submit(_fetch, url)
+            for a in tree.css(product_sel):
+                href = a.attributes.get("href")
+                if not href:
+                    continue
+                yield _abs_url(site_base, href)
+    finally:
+        # потребитель мог остановиться раньше (islice): незапущенную загрузку отменяем
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _page_url(category_url: str, param_name: str, page: int) -> str:
+    if page == 1:
+        return category_url
+    return f"{category_url}{'&' if '?' in category_url else '?'}{param_name}={page}"
+
+
+def _collect_param_pages(
+    category_url: str,
+    param_name: str,
+    product_sel: str,
+    site_base: str,
+    max_pages: Optional[int],
+    fetch: Callable[[str], LexborHTMLParser],
+    workers: int,
+    on_first_page: Optional[Callable[[LexborHTMLParser], None]],
+) -> Iterator[str]:
+    # номер страницы в параметре — адреса известны заранее: держим в полёте окно из workers страниц
+    # (RPS держит общий лимитер), товары отдаём строго по порядку страниц.
+    # Конец листинга — страница без товаров, 404 или повтор предыдущей (некоторые CMS отдают последнюю страницу на любой номер)
+    window = max(1, workers)
+    pool = ThreadPoolExecutor(max_workers=window)
+    pending: Deque = deque()
+    next_page = 1
+
+    def _submit() -> None:
+        nonlocal next_page
+        if max_pages is None or next_page <= max_pages:
+            pending.append(pool.submit(fetch, _page_url(category_url, param_name, next_page)))
+            next_page += 1
+
+    try:
+        for _ in range(window):
+            _submit()
+        prev_links: List[str] = []
+        first = True
+        while pending:
+            try:
+                tree = pending.popleft().result()
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 404 and not first:
+                    return
+                raise
+            if first and on_first_page is not None:
+                on_first_page(tree)
+            first = False
+            links = [_abs_url(site_base, href) for a in tree.css(product_sel) for href in (a.attributes.get("href"),) if href]
+            if not links or links == prev_links:
+                return
+            prev_links = links
+            _submit()
+            yield from links
+    finally:
+        # потребитель мог остановиться раньше (islice) или листинг кончился: лишние загрузки отменяем
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def collect_all_product_urls(profile: str, limit_per_category: int = 1000) -> Iterator[str]:
+    # один клиент на весь обход каталога: листинги и подкатегории одного хоста
+    with _http_client(get_settings()) as client:
+        yield from _collect_all_product_urls(profile, limit_per_category, client)
+
+
+def _collect_all_product_urls(profile: str, limit_per_category: int, client: httpx.Client) -> Iterator[str]:
     manifest = _load_manifest(profile)
     settings = get_settings()
-    rate = RateLimiter(settings.rate_limit_rps)
+    rate = _donor_rate_limiter(settings.rate_limit_rps)
 
     root_url = manifest.get("catalog", {}).get("root_url")
     cat_link_sel = manifest.get("catalog", {}).get("category_link_selector") or "a"
     if not root_url:
-        return []
-    seen_categories: set[str] = set()
-    to_visit: List[str] = [root_url]
-    product_urls: List[str] = []
+        return
+    # категория попадает в seen_categories при постановке в очередь: проверка "уже видели" — поиск в set,
+    # а не линейный проход по очереди на каждую ссылку страницы
+    seen_categories: set[str] = {root_url}
+    to_visit: Deque[str] = deque([root_url])
+    # дубликаты товаров отсекаем на лету, сохраняя порядок
+    seen: set[str] = set()
 
     while to_visit:
-        cur = to_visit.pop(0)
-        if cur in seen_categories:
-            continue
-        seen_categories.add(cur)
+        cur = to_visit.popleft()
 
-        # собрать товары текущей категории (с пагинацией)
+        # собрать товары текущей категории (с пагинацией); первую страницу листинга
+        # оставляем себе — подкатегории берём из неё же, без повторной загрузки и разбора
+        first_page: List[LexborHTMLParser] = []
         try:
-            urls = collect_category_urls(category_url=cur, profile=profile, limit=limit_per_category, offset=0)
-            product_urls.extend(urls)
+            for u in islice(_collect_category_urls(cur, profile, None, client, on_first_page=first_page.append), limit_per_category):
+                if u not in seen:
+                    seen.add(u)
+                    yield u
         except Exception:
             pass
 
         # найти подкатегории и добавить в очередь
         try:
-            rate.wait()
-            with httpx.Client(timeout=settings.requests_timeout) as client:
-                resp = client.get(cur)
-                resp.raise_for_status()
-                soup = BeautifulSoup(resp.text, "lxml")
+            if first_page:
+                tree = first_page[0]
+            else:
+                rate.wait()
+                tree = _fetch_html(client, cur)
             site_base = manifest.get("site", {}).get("base_url", cur)
-            for a in soup.select(cat_link_sel):
-                href = a.get("href")
+            for a in tree.css(cat_link_sel):
+                href = a.attributes.get("href")
                 if not href:
                     continue
                 full = _abs_url(site_base, href)
                 # избегаем зацикливания на ссылке "Каталог"
-                if full in seen_categories or full in to_visit:
+                if full in seen_categories:
                     continue
+                seen_categories.add(full)
                 to_visit.append(full)
         except Exception:
             pass
 
-    # убрать дубликаты товаров, сохраняя порядок
-    seen: set[str] = set()
-    unique: List[str] = []
-    for u in product_urls:
-        if u not in seen:
-            unique.append(u)
-            seen.add(u)
-    return unique
-
 
 def cluster_preview(profile: str, from_category: str, limit: int = 50):
     # Простая кластеризация по базовому external_id (последний сегмент URL без вариации)
-    urls = collect_category_urls(from_category, profile=profile, limit=limit)
+    urls = islice(collect_category_urls(from_category, profile=profile), limit)
     clusters: Dict[str, List[str]] = {}
     for u in urls:
         key = _external_id_from_url(u)
@@ -768,41 +1065,179 @@ def iterate_urls_from_file(path, limit: int = 50, offset: int = 0):
     p = Path(path)
     if not p.exists():
         return []
-    lines = [l.strip() for l in p.read_text(encoding="utf-8").splitlines() if l.strip()]
-    return lines[offset : offset + limit]
+    # читаем построчно и останавливаемся на offset+limit: в памяти только нужный срез, хвост файла не читается.
+    # Строки до offset пропускаем байтами, декодируем только возвращаемый срез
+    with p.open("rb") as f:
+        lines = (l.strip() for l in f)
+        return [l.decode("utf-8") for l in islice((l for l in lines if l), offset, offset + limit)]
+
+
+_DEBUG_BACKOFF = wait_exponential(multiplier=0.5, max=8)
+
+
+def _is_transient_status(resp: httpx.Response) -> bool:
+    return resp.status_code == 429 or resp.status_code >= 500
+
+
+def _is_transient(exc: BaseException) -> bool:
+    # сетевой сбой, 429 и 5xx повторяем; 404 и прочие 4xx — ответ донора, а не случайность
+    if isinstance(exc, httpx.HTTPStatusError):
+        return _is_transient_status(exc.response)
+    return isinstance(exc, httpx.TransportError)
+
+
+def _debug_retry_wait(retry_state) -> float:
+    # Retry-After донора (в секундах) важнее собственной экспоненты
+    outcome = retry_state.outcome
+    exc = outcome.exception()
+    resp = exc.response if isinstance(exc, httpx.HTTPStatusError) else (None if exc else outcome.result())
+    retry_after = resp.headers.get("retry-after", "") if resp is not None else ""
+    if retry_after.isdigit():
+        return min(float(retry_after), 30.0)
+    return _DEBUG_BACKOFF(retry_state)
+
+
+@retry(stop=stop_after_attempt(3), wait=_debug_retry_wait, retry=retry_if_exception(_is_transient), reraise=True)
+def _debug_fetch_html(client: httpx.Client, url: str, rate: RateLimiter) -> LexborHTMLParser:
+    # каждая попытка — через лимитер, иначе повтор обгонит RATE_LIMIT_RPS
+    rate.wait()
+    return _fetch_html(client, url)
+
+
+@retry(
+    stop=stop_after_attempt(3),
+    wait=_debug_retry_wait,
+    retry=retry_if_exception(_is_transient) | retry_if_result(_is_transient_status),
+    # попытки кончились на 429/5xx — отдаём последний ответ: его статус попадёт в отчёт
+    retry_error_callback=lambda retry_state: retry_state.outcome.result(),
+    reraise=True,
+)
+def _debug_request(client: httpx.Client, method: str, url: str, rate: RateLimiter, **kwargs) -> httpx.Response:
+    rate.wait()
+    return client.request(method, url, **kwargs)
+
+
+def _debug_get(client: httpx.Client, url: str, rate: RateLimiter, **kwargs) -> httpx.Response:
+    return _debug_request(client, "GET", url, rate, **kwargs)
+
+
+@dataclass(frozen=True, slots=True)
+class _DebugProfile:
+    site_base: str
+    sel: Dict[str, Optional[str]]
+    pa_slug: str
+    # акционная и обычная цена одним селектором: страница обходится один раз, а не дважды при отсутствии акции
+    price_any: Optional[str]
+
+
+def _debug_profile(profile: str) -> _DebugProfile:
+    pdir = _profile_dir(profile)
+    mf, amap = pdir / "manifest.yaml", pdir / "attributes.map.csv"
+    return _read_debug_profile(mf, _mtime_ns(mf), amap, _mtime_ns(amap))
+
+
+@lru_cache(maxsize=32)
+def _read_debug_profile(mf: Path, mf_mtime_ns: Optional[int], amap: Path, amap_mtime_ns: Optional[int]) -> _DebugProfile:
+    # всё, что debug-командам нужно из профиля, собираем один раз на версию файлов (ключ — mtime, как у остальных загрузчиков)
+    attr_map = _read_csv_map(amap, amap_mtime_ns) if amap_mtime_ns is not None else {}
+    sel = _read_product_selectors(mf, mf_mtime_ns)
+    return _DebugProfile(
+        site_base=_read_manifest(mf, mf_mtime_ns).get("site", {}).get("base_url", ""),
+        sel=sel,
+        pa_slug=attr_map.get("Обʼєм", "pa_obyem"),
+        price_any=", ".join(filter(None, (sel["price_sale"], sel["price_regular"]))) or None,
+    )
+
+
+def _debug_price_el(root, cfg: _DebugProfile) -> Optional[LexborNode]:
+    # узлы объединённого селектора идут в порядке документа — приоритет акционной цены восстанавливаем по css_matches
+    nodes = root.css(cfg.price_any) if cfg.price_any else []
+    sale = cfg.sel["price_sale"]
+    if sale:
+        for node in nodes:
+            if node.css_matches(sale):
+                return node
+    return nodes[0] if nodes else None
+
+
+def _debug_page_fields(tree: LexborHTMLParser, cfg: _DebugProfile, base: str) -> Dict[str, Optional[str]]:
+    # цена/артикул/первая картинка страницы — общий разбор для обеих debug-команд;
+    # ищем только внутри <body>, не обходя тяжёлый <head> со скриптами и стилями на каждый селектор
+    root = tree.body or tree
+    el = _debug_price_el(root, cfg)
+    sk = _css_first(root, cfg.sel["sku"])
+    img0 = root.css_first(_GALLERY_FIRST_IMG_SEL)
+    src = img0.attributes.get("src") if img0 else None
+    return {
+        "price": _text(el) if el else None,
+        "sku": _strip_artikul(_text(sk)) if sk else None,
+        "image": _abs_url(base, src) if src else None,
+    }
+
+
+def _cookie_state(client: httpx.Client) -> Tuple[Tuple[str, str, str], ...]:
+    return tuple(sorted((c.domain, c.name, c.value or "") for c in client.cookies.jar))
 
 
 def debug_variations(url: str, profile: str) -> List[Dict[str, Optional[str]]]:
-    manifest = _load_manifest(profile)
+    # один клиент на страницу, ajax-запросы и перезапросы всех вариаций: без TLS-рукопожатия на каждый запрос,
+    # а куки сессии, выставленные ajax-ответом, видны последующему перезапросу страницы
+    with _debug_http_client() as client:
+        return _debug_variations(url, profile, client)
+
+
+def debug_variations_batch(
+    urls: Iterable[str], profile: str, workers: int = 4
+) -> Iterator[Tuple[str, List[Dict[str, Optional[str]]]]]:
+    # товары идут параллельно на одном клиенте (пул соединений и лимитер RPS общие); URL берутся из итератора
+    # по мере освобождения воркеров — в работе не больше 2*workers товаров. Результаты — в порядке готовности
+    workers = max(1, workers)
+    with _debug_http_client() as client, ThreadPoolExecutor(max_workers=workers) as pool:
+        pending: Dict = {}
+
+        def _drain(futures) -> Iterator[Tuple[str, List[Dict[str, Optional[str]]]]]:
+            for fut in futures:
+                url = pending.pop(fut)
+                try:
+                    yield url, fut.result()
+                except Exception as e:
+                    yield url, [{"label": None, "error": str(e)}]
+
+        for url in urls:
+            pending[pool.submit(_debug_variations, url, profile, client)] = url
+            if len(pending) >= 2 * workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from _drain(done)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield from _drain(done)
+
+
+def _debug_variations(url: str, profile: str, client: httpx.Client) -> List[Dict[str, Optional[str]]]:
+    cfg = _debug_profile(profile)
     settings = get_settings()
-    rate = RateLimiter(settings.rate_limit_rps)
-    results: List[Dict[str, Optional[str]]] = []
+    rate = _donor_rate_limiter(settings.rate_limit_rps)
 
-    rate.wait()
-    with httpx.Client(timeout=settings.requests_timeout) as client:
-        resp = client.get(url)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "lxml")
+    tree = _debug_fetch_html(client, url, rate)
 
-    sel = manifest.get("product", {}).get("selectors", {})
-    site_base = manifest.get("site", {}).get("base_url", "")
+    site_base, pa_slug = cfg.site_base, cfg.pa_slug
 
     # собрать опции
-    pa_slug = _load_csv_map(_profile_dir(profile) / "attributes.map.csv").get("Обʼєм", "pa_obyem")
-    obem_buttons = soup.select(".product__modifications .modification .modification__body .modification__list .modification__button")
-    value_to_label: Dict[str, str] = {}
-    for b in obem_buttons:
-        label = _text(b)
-        if _is_placeholder_option(label):
-            continue
-        val = (b.get("data-value") or "").strip()
-        if val:
-            value_to_label[val] = _normalize_value(profile, pa_slug, label)
+    pa_values = _load_values_map(profile, pa_slug)
+    obem_buttons = tree.css(_OPTION_BUTTONS_SEL)
+    # один проход по кнопкам: подпись, отсев плейсхолдеров и data-value — без промежуточных списков
+    value_to_label: Dict[str, str] = {
+        val: pa_values.get(label, label)
+        for b, label in zip(obem_buttons, map(_text, obem_buttons))
+        if not _is_placeholder_option(label)
+        for val in ((b.attributes.get("data-value") or "").strip(),)
+        if val
+    }
 
-    form = soup.select_one(".product__modifications form[method=post]")
-    action = (form.get("data-action") or form.get("action") or "").strip() if form else ""
-    hidden = form.select_one("input[name^=\"param[\"]") if form else None
-    param_name = hidden.get("name") if hidden else "param[obem]"
+    form = tree.css_first(_MODIFICATIONS_FORM_SEL)
+    action = (form.attributes.get("data-action") or form.attributes.get("action") or "").strip() if form else ""
+    hidden = form.css_first(_PARAM_INPUT_SEL) if form else None
+    param_name = hidden.attributes.get("name") if hidden else "param[obem]"
 
     ajax_headers = {
         "Referer": url,
@@ -811,63 +1246,102 @@ def debug_variations(url: str, profile: str) -> List[Dict[str, Optional[str]]]:
         "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
     }
 
-    debug_dir = _workspace_root() / "debug"
-    debug_dir.mkdir(exist_ok=True)
-    for val, label in value_to_label.items():
-        entry: Dict[str, Optional[str]] = {"label": label, "ajax_get": None, "ajax_post": None, "price": None, "sku": None, "image": None}
-        if action:
-            action_url = _abs_url(site_base or url, action)
-            try:
-                rate.wait()
-                with httpx.Client(timeout=settings.requests_timeout, headers=ajax_headers, follow_redirects=True) as sclient:
-                    r = sclient.get(action_url, params={param_name: val})
-                    entry["ajax_get"] = f"{r.status_code} {r.headers.get('content-type','')}"
-                    if r.is_redirect:  # type: ignore[attr-defined]
-                        entry["ajax_get"] += f" -> {r.headers.get('location','')}"
-                    # сохранить html ответа GET для анализа
-                    try:
-                        (debug_dir / f"ajax_get_{val}.html").write_text(r.text, encoding="utf-8")
-                    except Exception:
-                        pass
-                    if r.status_code >= 400:
-                        rp = sclient.post(action_url, data={param_name: val})
-                        entry["ajax_post"] = f"{rp.status_code} {rp.headers.get('content-type','')}"
-                        try:
-                            (debug_dir / f"ajax_post_{val}.html").write_text(rp.text, encoding="utf-8")
-                        except Exception:
-                            pass
-            except Exception as e:
-                entry["ajax_get"] = f"error: {e}"
+    debug_dir = _debug_dir()
+    # в batch-режиме товары пробуются параллельно: без external_id в имени дампы одинаковых опций перетирают друг друга
+    dump_prefix = _external_id_from_url(url)
+    action_url = _abs_url(site_base or url, action) if action else ""
+    page_tree, page_cookies = tree, _cookie_state(client)
+    page_fields: Optional[Dict[str, Optional[str]]] = None
+
+    def _ajax_fields(r: httpx.Response) -> Optional[Dict[str, Optional[str]]]:
+        # ajax сразу отдал JSON с полями вариации — страницу под эту опцию перечитывать не нужно
+        if r.status_code != 200 or "json" not in r.headers.get("content-type", ""):
+            return None
+        data = _json_body(r)
+        fields = _scan_ajax_json(data) if isinstance(data, dict) else {}
+        if not fields:
+            return None
+        return {
+            "price": str(fields["price"]) if "price" in fields else None,
+            "sku": fields.get("sku"),
+            "image": _abs_url(site_base or url, fields["image"]) if "image" in fields else None,
+        }
+
+    def _probe_ajax(val: str) -> Tuple[Dict[str, Optional[str]], bool, Optional[Dict[str, Optional[str]]]]:
+        # ajax-запрос одной опции; дальше — выставил ли ответ куки (сменил состояние сессии) и поля из JSON-ответа
+        info: Dict[str, Optional[str]] = {"ajax_get": None, "ajax_post": None}
+        touched = False
+        fields = None
+        if not action:
+            return info, touched, fields
+        try:
+            r = _debug_get(client, action_url, rate, params={param_name: val}, headers=ajax_headers, follow_redirects=True)
+            touched = "set-cookie" in r.headers
+            info["ajax_get"] = f"{r.status_code} {r.headers.get('content-type','')}"
+            if r.is_redirect:  # type: ignore[attr-defined]
+                info["ajax_get"] += f" -> {r.headers.get('location','')}"
+            # сохранить html ответа GET для анализа
+            dump.submit((debug_dir / f"ajax_get_{dump_prefix}_{val}.html").write_bytes, r.content)
+            fields = _ajax_fields(r)
+            if r.status_code >= 400:
+                rp = _debug_request(client, "POST", action_url, rate, data={param_name: val}, headers=ajax_headers, follow_redirects=True)
+                touched = touched or "set-cookie" in rp.headers
+                info["ajax_post"] = f"{rp.status_code} {rp.headers.get('content-type','')}"
+                dump.submit((debug_dir / f"ajax_post_{dump_prefix}_{val}.html").write_bytes, rp.content)
+        except Exception as e:
+            info["ajax_get"] = f"error: {e}"
+        return info, touched, fields
 
+    def _current_page_fields() -> Dict[str, Optional[str]]:
         # после ajax попробуем вытащить из текущей страницы (или повторным GET страницы вариации, если удаётся вывести)
+        nonlocal page_tree, page_cookies, page_fields
         try:
-            # перезапрос страницы (часто ajax меняет серверно, но если нет — хотя бы текущие)
-            rate.wait()
-            with httpx.Client(timeout=settings.requests_timeout) as r2:
-                page = r2.get(url)
-                page.raise_for_status()
-                vsoup = BeautifulSoup(page.text, "lxml")
-            el = vsoup.select_one(sel.get("price_sale", "")) or vsoup.select_one(sel.get("price_regular", ""))
-            entry["price"] = _text(el) if el else None
-            sk = vsoup.select_one(sel.get("sku", ""))
-            entry["sku"] = re.sub(r"^\s*Артикул\s*:\s*", "", _text(sk), flags=re.IGNORECASE) if sk else None
-            img0 = vsoup.select_one(".gallery__photos .gallery__item:first-child .gallery__photo-img")
-            entry["image"] = _abs_url(site_base or url, img0.get("src")) if img0 and img0.get("src") else None
+            # перезапрос страницы нужен, только если ajax поменял состояние сессии (куки); иначе сервер отдаст ту же
+            # страницу — берём уже разобранную
+            cookies = _cookie_state(client)
+            if cookies != page_cookies:
+                page_tree = _debug_fetch_html(client, url, rate)
+                page_cookies = _cookie_state(client)
+                page_fields = None
+            if page_fields is None:
+                # поля читаем один раз на разобранную страницу, а не на каждую вариацию
+                page_fields = _debug_page_fields(page_tree, cfg, site_base or url)
+            return page_fields
         except Exception as e:
-            entry["price"] = entry["price"] or f"error: {e}"
-
-        results.append(entry)
-
+            return {"price": f"error: {e}", "sku": None, "image": None}
+
+    # дампы пишет отдельный поток: запросы вариаций не ждут диска; ошибки записи, как и раньше, не роняют отладку.
+    # Выход из with дожидается записи всех файлов
+    with ThreadPoolExecutor(max_workers=1) as dump:
+        # ajax-запросы опций независимы: шлём параллельно на общем клиенте (RPS держит общий лимитер)
+        with ThreadPoolExecutor(max_workers=max(1, min(settings.variation_workers, len(value_to_label)))) as pool:
+            probes = dict(zip(value_to_label, pool.map(_probe_ajax, value_to_label)))
+        if not any(touched and fields is None for _, touched, fields in probes.values()):
+            # страница нужна только опциям без JSON, и их ajax не тронул сессию — она для всех одна и та же
+            return [
+                {"label": label, **info, **(fields or _current_page_fields())}
+                for label, (info, _, fields) in zip(value_to_label.values(), probes.values())
+            ]
+        # ajax меняет состояние сессии: параллельные ответы его перемешали, поэтому опции без JSON проходим заново
+        # по очереди — страница каждой вариации читается сразу после её ajax-запроса
+        results: List[Dict[str, Optional[str]]] = []
+        for val, label in value_to_label.items():
+            info, _, fields = probes[val]
+            if fields is None:
+                info, _, fields = _probe_ajax(val)
+            results.append({"label": label, **info, **(fields or _current_page_fields())})
     return results
 
 
 def _guess_variant_url(base_url: str, label: str) -> Optional[str]:
-    m = re.search(r"(\d+)", label)
+    m = _DIGITS_RE.search(label)
     if not m:
         return None
     n = m.group(1)
-    if re.search(r"-(\d+)-ml/?$", base_url):
-        return re.sub(r"-(\d+)-ml/?$", f"-{n}-ml/", base_url)
+    # один проход регулярки вместо search + sub
+    guessed, found = _ML_URL_RE.subn(f"-{n}-ml/", base_url, count=1)
+    if found:
+        return guessed
     # generic fallback: append size at end
     if base_url.endswith('/'):
         return base_url + f"{n}-ml/"
@@ -875,19 +1349,20 @@ def _guess_variant_url(base_url: str, label: str) -> Optional[str]:
 
 
 def debug_variant_urls(url: str, profile: str) -> List[Dict[str, Optional[str]]]:
-    manifest = _load_manifest(profile)
+    # один клиент на товар и все угаданные URL вариаций: без нового TLS-рукопожатия на каждую опцию
+    with _debug_http_client() as client:
+        return _debug_variant_urls(url, profile, client)
+
+
+def _debug_variant_urls(url: str, profile: str, client: httpx.Client) -> List[Dict[str, Optional[str]]]:
+    cfg = _debug_profile(profile)
     settings = get_settings()
-    rate = RateLimiter(settings.rate_limit_rps)
-    site_base = manifest.get("site", {}).get("base_url", "")
-    sel = manifest.get("product", {}).get("selectors", {})
+    rate = _donor_rate_limiter(settings.rate_limit_rps)
+    site_base = cfg.site_base
 
-    rate.wait()
-    with httpx.Client(timeout=settings.requests_timeout) as client:
-        resp = client.get(url)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "lxml")
+    tree = _debug_fetch_html(client, url, rate)
 
-    obem_buttons = soup.select(".product__modifications .modification .modification__body .modification__list .modification__button")
+    obem_buttons = tree.css(_OPTION_BUTTONS_SEL)
     labels = []
     for b in obem_buttons:
         label = _text(b)
@@ -895,26 +1370,22 @@ def debug_variant_urls(url: str, profile: str) -> List[Dict[str, Optional[str]]]
             continue
         labels.append(label)
 
-    out: List[Dict[str, Optional[str]]] = []
-    for label in labels:
-        vurl = _guess_variant_url(url, label)
-        entry: Dict[str, Optional[str]] = {"label": label, "url": vurl, "price": None, "sku": None, "image": None}
-        if not vurl:
-            out.append(entry)
-            continue
+    guessed = [(label, _guess_variant_url(url, label)) for label in labels]
+    # каждый URL качаем один раз: одинаковые угадки не дублируются, а URL самой страницы берём из уже разобранного дерева
+    pages: Dict[str, Dict[str, Optional[str]]] = {url: _debug_page_fields(tree, cfg, site_base or url)}
+    to_fetch = [vurl for vurl in dict.fromkeys(vurl for _, vurl in guessed if vurl) if vurl not in pages]
+
+    def _probe(vurl: str) -> Dict[str, Optional[str]]:
         try:
-            rate.wait()
-            with httpx.Client(timeout=settings.requests_timeout) as c:
-                r = c.get(vurl)
-                r.raise_for_status()
-                vsoup = BeautifulSoup(r.text, "lxml")
-            el = vsoup.select_one(sel.get("price_sale", "")) or vsoup.select_one(sel.get("price_regular", ""))
-            entry["price"] = _text(el) if el else None
-            sk = vsoup.select_one(sel.get("sku", ""))
-            entry["sku"] = re.sub(r"^\s*Артикул\s*:\s*", "", _text(sk), flags=re.IGNORECASE) if sk else None
-            img0 = vsoup.select_one(".gallery__photos .gallery__item:first-child .gallery__photo-img")
-            entry["image"] = _abs_url(site_base or vurl, img0.get("src")) if img0 and img0.get("src") else None
+            return _debug_page_fields(_debug_fetch_html(client, vurl, rate), cfg, site_base or vurl)
         except Exception:
-            pass
-        out.append(entry)
-    return out
+            return {}
+
+    # угаданные URL проверяем параллельно: запросы идут потоками HTTP/2 по соединению, уже открытому страницей товара;
+    # RPS держит общий лимитер, порядок — как у кнопок
+    with ThreadPoolExecutor(max_workers=max(1, min(settings.variation_workers, len(to_fetch)))) as pool:
+        pages.update(zip(to_fetch, pool.map(_probe, to_fetch)))
+    return [
+        {"label": label, "url": vurl, "price": None, "sku": None, "image": None, **(pages.get(vurl) or {})}
+        for label, vurl in guessed
+    ]
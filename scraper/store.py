@@ -1,49 +1,157 @@
 from __future__ import annotations
+import atexit
 import sqlite3
+import threading
+from contextlib import contextmanager
+from itertools import groupby
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Iterable, Iterator, List, Optional, Dict, Any, Tuple
 
 SCHEMA = (
     "CREATE TABLE IF NOT EXISTS products (\n"
     " external_id TEXT PRIMARY KEY,\n"
     " woo_product_id INTEGER,\n"
-    " last_pushed_at TEXT DEFAULT CURRENT_TIMESTAMP\n"
+    " last_pushed_at TEXT DEFAULT CURRENT_TIMESTAMP,\n"
+    " content_hash TEXT\n"
     ");"
 )
 
+_UPSERT_SQL = (
+    "INSERT INTO products(external_id, woo_product_id) VALUES(?, ?)\n"
+    "ON CONFLICT(external_id) DO UPDATE SET woo_product_id=excluded.woo_product_id, last_pushed_at=CURRENT_TIMESTAMP"
+)
+_UPSERT_HASH_SQL = (
+    "INSERT INTO products(external_id, woo_product_id, content_hash) VALUES(?, ?, ?)\n"
+    "ON CONFLICT(external_id) DO UPDATE SET woo_product_id=excluded.woo_product_id, content_hash=excluded.content_hash, last_pushed_at=CURRENT_TIMESTAMP"
+)
+
+# push-batch пишет чекпоинты из нескольких потоков: общее соединение на БД используется под локом
+_write_lock = threading.Lock()
+_conns: Dict[Path, sqlite3.Connection] = {}
+
+
+def _connect(db_path: Path, **kwargs) -> sqlite3.Connection:
+    # synchronous — настройка соединения, а не файла: в WAL при NORMAL fsync только на чекпоинте журнала, не на каждый commit
+    conn = sqlite3.connect(db_path, **kwargs)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # до ~20 МБ кэша страниц (по умолчанию ~2 МБ): на больших каталогах индекс чекпоинтов целиком в памяти;
+    # память выделяется по мере чтения, а не сразу
+    conn.execute("PRAGMA cache_size=-20000")
+    return conn
+
+
+def _shared_conn(db_path: Path) -> sqlite3.Connection:
+    # одно соединение на файл БД на весь процесс (вызывать под _write_lock): без открытия файла,
+    # разбора схемы и холодного кэша страниц на каждый чекпоинт
+    key = Path(db_path).resolve()
+    conn = _conns.get(key)
+    if conn is None:
+        conn = _conns[key] = _connect(key, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+    return conn
+
+
+@atexit.register
+def _close_shared_conns() -> None:
+    with _write_lock:
+        for conn in _conns.values():
+            conn.close()
+        _conns.clear()
+
 
 def init_db(db_path: Path) -> None:
     db_path = Path(db_path)
     conn = sqlite3.connect(db_path)
     try:
         cur = conn.cursor()
+        # WAL переживает переподключения: запись не блокирует чтение, fsync реже
+        cur.execute("PRAGMA journal_mode=WAL")
         cur.executescript(SCHEMA)
+        # миграция БД, созданных до появления content_hash
+        cols = {row[1] for row in cur.execute("PRAGMA table_info(products)")}
+        if "content_hash" not in cols:
+            cur.execute("ALTER TABLE products ADD COLUMN content_hash TEXT")
         conn.commit()
     finally:
         conn.close()
 
 
-def upsert_product_checkpoint(external_id: str, woo_product_id: int, db_path: Path = Path("wooparser.db")) -> None:
-    conn = sqlite3.connect(db_path)
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO products(external_id, woo_product_id) VALUES(?, ?)\n"
-            "ON CONFLICT(external_id) DO UPDATE SET woo_product_id=excluded.woo_product_id, last_pushed_at=CURRENT_TIMESTAMP",
-            (external_id, woo_product_id),
-        )
-        conn.commit()
-    finally:
-        conn.close()
+def upsert_product_checkpoint(external_id: str, woo_product_id: int, db_path: Path = Path("wooparser.db"), content_hash: Optional[str] = None) -> None:
+    upsert_product_checkpoints([(external_id, woo_product_id, content_hash)], db_path=db_path)
+
+
+def upsert_product_checkpoints(rows: Iterable[Tuple[str, int, Optional[str]]], db_path: Path = Path("wooparser.db")) -> None:
+    # пачка чекпоинтов (external_id, woo_product_id, content_hash) — одна транзакция и один commit на всю пачку.
+    # Подряд идущие строки с хэшем и без идут одним executemany; порядок строк сохраняется — побеждает последняя
+    with _write_lock:
+        conn = _shared_conn(db_path)
+        # with conn: commit, а при ошибке — rollback, чтобы общее соединение не осталось в открытой транзакции
+        with conn:
+            for hashed, group in groupby(rows, key=lambda row: row[2] is not None):
+                if hashed:
+                    conn.executemany(_UPSERT_HASH_SQL, group)
+                else:
+                    conn.executemany(_UPSERT_SQL, (row[:2] for row in group))
 
 
 def get_checkpoint_by_external_id(external_id: str, db_path: Path = Path("wooparser.db")) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(db_path)
-    try:
-        conn.row_factory = sqlite3.Row
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM products WHERE external_id=?", (external_id,))
-        row = cur.fetchone()
+    with _write_lock:
+        row = _shared_conn(db_path).execute("SELECT * FROM products WHERE external_id=?", (external_id,)).fetchone()
         return dict(row) if row else None
+
+
+class CheckpointBatch:
+    # Чекпоинты push-batch копятся в памяти и пишутся пачками по flush_every одной транзакцией через общее
+    # соединение под _write_lock: своей долгой транзакции на отдельном соединении нет, поэтому параллельные
+    # записи в ту же БД не упираются в "database is locked"
+    def __init__(self, db_path: Path, flush_every: int) -> None:
+        self._db_path = db_path
+        self._flush_every = max(1, flush_every)
+        self._rows: List[Tuple[str, int, Optional[str]]] = []
+        # external_id -> незаписанные поля: батч видит свои чекпоинты до flush
+        self._overlay: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, external_id: str, woo_product_id: int, content_hash: Optional[str] = None) -> None:
+        with self._lock:
+            self._rows.append((external_id, woo_product_id, content_hash))
+            prev = self._overlay.get(external_id)
+            # как и в SQL: строка без хэша не затирает сохранённый
+            if content_hash is None and prev:
+                content_hash = prev["content_hash"]
+            self._overlay[external_id] = {"woo_product_id": woo_product_id, "content_hash": content_hash}
+            if len(self._rows) >= self._flush_every:
+                self._flush()
+
+    def get(self, external_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            pending = self._overlay.get(external_id)
+        row = get_checkpoint_by_external_id(external_id, db_path=self._db_path)
+        if pending is None:
+            return row
+        row = row or {"external_id": external_id, "last_pushed_at": None, "content_hash": None}
+        row["woo_product_id"] = pending["woo_product_id"]
+        if pending["content_hash"] is not None:
+            row["content_hash"] = pending["content_hash"]
+        return row
+
+    def _flush(self) -> None:
+        if self._rows:
+            upsert_product_checkpoints(self._rows, db_path=self._db_path)
+        self._rows = []
+        self._overlay.clear()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+
+
+@contextmanager
+def checkpoint_batch(db_path: Path, flush_every: int = 50) -> Iterator[CheckpointBatch]:
+    batch = CheckpointBatch(db_path, flush_every)
+    try:
+        yield batch
     finally:
-        conn.close()
+        # записываем и при ошибке: товары из батча уже залиты в Woo
+        batch.flush()
@@ -3,7 +3,6 @@ import threading
 import time
 import logging
 from typing import Callable
-from rich.logging import RichHandler
 
 _logger_initialized = False
 
@@ -11,6 +10,9 @@ _logger_initialized = False
 def get_logger(name: str = "scraper") -> logging.Logger:
     global _logger_initialized
     if not _logger_initialized:
+        # rich тянем только при первой настройке логгера, а не при импорте utils
+        from rich.logging import RichHandler
+
         logging.basicConfig(
             level=logging.INFO,
             format="%(message)s",
@@ -22,18 +24,25 @@ def get_logger(name: str = "scraper") -> logging.Logger:
 
 
 class RateLimiter:
+    # Token bucket: за секунду можно отправить до rps запросов подряд (ёмкость не меньше одного),
+    # дальше токены восстанавливаются по одному раз в 1/rps секунд
     def __init__(self, rps: float) -> None:
         self.min_interval = 1.0 / rps if rps > 0 else 0.0
+        self.capacity = max(1.0, rps)
         self._lock = threading.Lock()
-        self._last = 0.0
+        self._tokens = self.capacity
+        self._last = time.monotonic()
 
     def wait(self) -> None:
         if self.min_interval <= 0:
             return
+        # под локом только резервируем токен (баланс может уйти в минус — это очередь следующих слотов),
+        # спим уже без лока, чтобы параллельные потоки не ждали друг друга на самом локе
         with self._lock:
-            now = time.perf_counter()
-            delta = now - self._last
-            wait_for = self.min_interval - delta
-            if wait_for > 0:
-                time.sleep(wait_for)
-            self._last = time.perf_counter()
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) / self.min_interval)
+            self._last = now
+            self._tokens -= 1.0
+            delay = -self._tokens * self.min_interval if self._tokens < 0 else 0.0
+        if delay > 0:
+            time.sleep(delay)
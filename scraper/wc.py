@@ -1,12 +1,33 @@
 from __future__ import annotations
-from typing import List, Optional, Dict, Any
+from typing import IO, Any, Callable, Dict, List, Optional
+import mimetypes
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import quote
 import httpx
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception
 from .config import Settings, get_settings
 from .utils import RateLimiter, get_logger
 
 logger = get_logger("wc")
 
+
+_BATCH_LIMIT = 100
+_RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+
+def _is_transient(exc: BaseException) -> bool:
+    # 401/403/404/422 от Woo не исправятся повтором: ретраим только сеть, таймауты, 429 и 5xx
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in _RETRY_STATUSES
+    return isinstance(exc, httpx.TransportError)
+
+
+def _variation_key(attrs: List[Dict[str, Any]]) -> frozenset:
+    return frozenset((a.get("id") or a.get("name"), a.get("option")) for a in attrs)
+
+
 class WooClient:
     def __init__(self, base_url: str, api_version: str, auth: httpx.Auth | tuple[str, str], timeout: int = 30, rate_limit_rps: float = 0.5) -> None:
         self.base_url = base_url.rstrip("/")
@@ -14,6 +35,59 @@ class WooClient:
         self.auth = auth
         self.timeout = timeout
         self.rate_limiter = RateLimiter(rate_limit_rps)
+        # префиксы REST-путей собираем один раз, а не на каждый запрос
+        self._wc_base = f"{self.base_url}/wp-json/{api_version}/"
+        self._wp_base = f"{self.base_url}/wp-json/wp/v2/"
+        # кэши ensure_* на время жизни клиента (один push-batch)
+        self._attr_cache: Dict[str, int] = {}
+        self._attr_terms_cache: Dict[tuple, List[int]] = {}
+        self._term_cache: Dict[tuple, Dict[str, Any]] = {}
+        self._cat_chain_cache: Dict[tuple, List[int]] = {}
+        # slug -> категория; грузится целиком при первом обращении вместо постраничного поиска на каждый slug
+        self._cat_index: Optional[Dict[str, Dict[str, Any]]] = None
+        # slug/имя -> id глобального атрибута и id атрибута -> {имя терма: id}: списки читаются один раз,
+        # а не на каждый новый атрибут или новый набор опций товара; созданное дописывается сюда же
+        self._attr_index: Optional[Dict[str, int]] = None
+        self._attr_term_ids: Dict[int, Dict[str, int]] = {}
+        # push-batch зовёт ensure_* из нескольких потоков. _ensure_lock короткий — только кэши и реестр локов;
+        # HTTP идёт под локом своего ключа: одинаковые create не дублируются, а разные ключи не ждут друг друга
+        self._ensure_lock = threading.Lock()
+        self._key_locks: Dict[tuple, threading.Lock] = {}
+        # один клиент на время жизни WooClient: keep-alive и TLS-сессия к Woo переиспользуются между запросами
+        # (httpx.Client потокобезопасен — его делят потоки push-batch)
+        self._client = httpx.Client(
+            auth=auth,
+            timeout=timeout,
+            http2=True,
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        )
+
+    def close(self) -> None:
+        self._client.close()
+
+    def __enter__(self) -> "WooClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _key_lock(self, key: tuple) -> threading.Lock:
+        with self._ensure_lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _cached(self, cache: dict, key: Any, lock_key: tuple, compute: Callable[[], Any]) -> Any:
+        with self._ensure_lock:
+            if key in cache:
+                return cache[key]
+        with self._key_lock(lock_key):
+            # пока ждали лок ключа, значение мог посчитать другой поток
+            with self._ensure_lock:
+                if key in cache:
+                    return cache[key]
+            value = compute()
+            with self._ensure_lock:
+                cache[key] = value
+            return value
 
     @classmethod
     def from_settings(cls, s: Settings | None = None) -> "WooClient":
@@ -27,21 +101,25 @@ class WooClient:
         return cls(base_url=s.wp_base_url, api_version=s.wc_api_version, auth=auth, timeout=s.requests_timeout, rate_limit_rps=s.rate_limit_rps)
 
     def _wc_url(self, endpoint: str) -> str:
-        return f"{self.base_url}/wp-json/{self.api_version}/{endpoint.lstrip('/')}"
+        return self._wc_base + endpoint.lstrip("/")
 
     def _wp_url(self, endpoint: str) -> str:
-        return f"{self.base_url}/wp-json/wp/v2/{endpoint.lstrip('/')}"
+        return self._wp_base + endpoint.lstrip("/")
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=8), reraise=True)
-    def _request(self, method: str, url: str, *, json: Optional[dict] = None, params: Optional[dict] = None, headers: Optional[dict] = None) -> Any:
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=1, max=8), retry=retry_if_exception(_is_transient), reraise=True)
+    def _request(self, method: str, url: str, *, json: Optional[dict] = None, params: Optional[dict] = None, headers: Optional[dict] = None, content: Optional[IO[bytes]] = None) -> Any:
         self.rate_limiter.wait()
-        with httpx.Client(auth=self.auth, timeout=self.timeout, headers=headers) as client:
-            resp = client.request(method, url, json=json, params=params)
-            if resp.status_code >= 400:
-                logger.error("HTTP %s %s -> %s %s", method, url, resp.status_code, resp.text[:200])
-            resp.raise_for_status()
-            ct = resp.headers.get("content-type", "")
-            return resp.json() if "json" in ct or resp.text.startswith("{") else resp.text
+        if content is not None:
+            # повтор после сетевой ошибки должен отправить файл заново, а не его недочитанный хвост
+            content.seek(0)
+        resp = self._client.request(method, url, json=json, params=params, headers=headers, content=content)
+        if resp.status_code >= 400:
+            logger.error("HTTP %s %s -> %s %s", method, url, resp.status_code, resp.text[:200])
+        resp.raise_for_status()
+        # Woo/WP отдают JSON с нужным Content-Type; без него смотрим первый байт тела, не декодируя весь ответ в str
+        if "json" in resp.headers.get("content-type", "") or resp.content[:1] in (b"{", b"["):
+            return resp.json()
+        return resp.text
 
     # Products
     def create_product(self, payload: Dict[str, Any]) -> Dict[str, Any]:
@@ -65,21 +143,20 @@ class WooClient:
     def create_variations(self, product_id: int, payload_list: List[Dict[str, Any]]) -> Dict[str, Any]:
         # Загрузим существующие вариации
         existing = self._request("GET", self._wc_url(f"products/{product_id}/variations"))
-        existing_map = {}
-        existing_keys = set()
+        # ключ — frozenset пар (атрибут, опция): порядок атрибутов не важен, сортировать не нужно
+        existing_map: Dict[frozenset, Dict[str, Any]] = {}
         for v in existing if isinstance(existing, list) else []:
-            attrs = v.get("attributes", [])
-            key = tuple(sorted((a.get("id") or a.get("name"), a.get("option")) for a in attrs))
-            existing_keys.add(key)
-            existing_map[key] = v
+            existing_map[_variation_key(v.get("attributes", []))] = v
         to_create: List[Dict[str, Any]] = []
         to_update: List[Dict[str, Any]] = []
         for p in payload_list:
             attrs = p.get("attributes", [])
-            key = tuple(sorted((a.get("id") or a.get("name"), a.get("option")) for a in attrs))
-            if key in existing_keys:
+            if not attrs:
+                continue
+            key = _variation_key(attrs)
+            if key in existing_map:
                 # Подготовим update только если есть изменения цены/sku/картинки
-                v = existing_map.get(key) or {}
+                v = existing_map[key]
                 update = {"id": v.get("id")}
                 if not update["id"]:
                     continue
@@ -114,29 +191,58 @@ class WooClient:
         res = self._request("GET", self._wc_url("products/categories"), params={"page": page, "per_page": per_page})
         return res if isinstance(res, list) else []
 
-    def find_category_by_slug(self, slug: str) -> Optional[Dict[str, Any]]:
+    def _fetch_category_index(self) -> Dict[str, Dict[str, Any]]:
+        index: Dict[str, Dict[str, Any]] = {}
         page = 1
         while True:
             items = self._categories_list_page(page=page, per_page=100)
-            if not items:
-                break
             for it in items:
-                if it.get("slug") == slug:
-                    return it
+                index.setdefault(it.get("slug"), it)
+            # неполная страница — последняя: без лишнего запроса за пустой
+            if len(items) < 100:
+                break
             page += 1
-        return None
+        return index
+
+    def _category_index(self) -> Dict[str, Dict[str, Any]]:
+        if self._cat_index is None:
+            with self._key_lock(("cat_index",)):
+                if self._cat_index is None:
+                    self._cat_index = self._fetch_category_index()
+        return self._cat_index
+
+    def prefetch_indexes(self) -> None:
+        # Категории и глобальные атрибуты друг от друга не зависят (и локи у них разные): читаем их параллельно,
+        # чтобы первый товар батча ждал один RTT, а не сумму; RateLimiter по-прежнему общий
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            for fut in [pool.submit(self._category_index), pool.submit(self._attribute_index)]:
+                fut.result()
+
+    def _remember_category(self, cat: Dict[str, Any]) -> Dict[str, Any]:
+        if self._cat_index is not None and cat.get("slug"):
+            with self._ensure_lock:
+                self._cat_index[cat["slug"]] = cat
+        return cat
+
+    def find_category_by_slug(self, slug: str) -> Optional[Dict[str, Any]]:
+        return self._category_index().get(slug)
 
     def create_category(self, name: str, slug: str, parent_id: Optional[int] = None) -> Dict[str, Any]:
         payload: Dict[str, Any] = {"name": name, "slug": slug}
         if parent_id:
             payload["parent"] = parent_id
-        return self._request("POST", self._wc_url("products/categories"), json=payload)
+        return self._remember_category(self._request("POST", self._wc_url("products/categories"), json=payload))
 
     def update_category_parent(self, category_id: int, parent_id: Optional[int]) -> Dict[str, Any]:
         payload: Dict[str, Any] = {"parent": parent_id or 0}
-        return self._request("PUT", self._wc_url(f"products/categories/{category_id}"), json=payload)
+        return self._remember_category(self._request("PUT", self._wc_url(f"products/categories/{category_id}"), json=payload))
 
     def ensure_category(self, slug: str, name_fallback: Optional[str] = None, parent_id: Optional[int] = None) -> Dict[str, Any]:
+        # общий родитель у цепочек из разных потоков: создаём/правим категорию под локом её slug
+        with self._key_lock(("cat", slug)):
+            return self._ensure_category(slug, name_fallback, parent_id)
+
+    def _ensure_category(self, slug: str, name_fallback: Optional[str] = None, parent_id: Optional[int] = None) -> Dict[str, Any]:
         found = self.find_category_by_slug(slug)
         if found:
             # При необходимости скорректируем parent
@@ -153,6 +259,11 @@ class WooClient:
         return self.create_category(name=name, slug=slug, parent_id=parent_id)
 
     def ensure_categories_hierarchy(self, slugs_in_order: list[str], names_in_order: Optional[list[str]] = None) -> list[int]:
+        key = tuple(slugs_in_order)
+        ids = self._cached(self._cat_chain_cache, key, ("chain", key), lambda: self._ensure_categories_hierarchy(slugs_in_order, names_in_order))
+        return list(ids)
+
+    def _ensure_categories_hierarchy(self, slugs_in_order: list[str], names_in_order: Optional[list[str]] = None) -> list[int]:
         ids: list[int] = []
         parent_id: Optional[int] = None
         for idx, slug in enumerate(slugs_in_order):
@@ -166,10 +277,30 @@ class WooClient:
 
     # Attributes
     def ensure_global_attribute(self, name_or_slug: str) -> int:
-        attrs = self._request("GET", self._wc_url("products/attributes"))
-        for a in attrs:
-            if a.get("slug") == name_or_slug or a.get("name") == name_or_slug:
-                return a["id"]
+        # один лок на все атрибуты: slug и имя могут указывать на один атрибут, создавать его дважды нельзя;
+        # промахи редки — индекс атрибутов грузится целиком
+        return self._cached(self._attr_cache, name_or_slug, ("attr",), lambda: self._ensure_global_attribute(name_or_slug))
+
+    def _fetch_attribute_index(self) -> Dict[str, int]:
+        index: Dict[str, int] = {}
+        # setdefault в порядке списка: как и при линейном поиске, побеждает первый атрибут с таким slug или именем
+        for a in self._request("GET", self._wc_url("products/attributes")):
+            for key in (a.get("slug"), a.get("name")):
+                if key:
+                    index.setdefault(key, a["id"])
+        return index
+
+    def _attribute_index(self) -> Dict[str, int]:
+        if self._attr_index is None:
+            with self._key_lock(("attr_index",)):
+                if self._attr_index is None:
+                    self._attr_index = self._fetch_attribute_index()
+        return self._attr_index
+
+    def _ensure_global_attribute(self, name_or_slug: str) -> int:
+        index = self._attribute_index()
+        if name_or_slug in index:
+            return index[name_or_slug]
         payload = {"type": "select"}
         # если передан slug pa_*
         if name_or_slug.startswith("pa_"):
@@ -179,22 +310,50 @@ class WooClient:
         else:
             payload.update({"name": name_or_slug})
         created = self._request("POST", self._wc_url("products/attributes"), json=payload)
+        for key in (created.get("slug"), created.get("name"), name_or_slug):
+            if key:
+                index.setdefault(key, created["id"])
         return created["id"]
 
     def ensure_attribute_terms(self, attr_id: int, options: List[str]) -> List[int]:
-        existing = self._request("GET", self._wc_url(f"products/attributes/{attr_id}/terms"))
-        existing_names = {t["name"]: t["id"] for t in existing}
-        ids: List[int] = []
-        for opt in options:
-            if opt in existing_names:
-                ids.append(existing_names[opt])
-            else:
-                created = self._request("POST", self._wc_url(f"products/attributes/{attr_id}/terms"), json={"name": opt})
-                ids.append(created["id"])
-        return ids
+        key = (attr_id, tuple(options))
+        # термы одного атрибута создаются по очереди (общая карта имён), разные атрибуты — параллельно
+        ids = self._cached(self._attr_terms_cache, key, ("terms", attr_id), lambda: self._ensure_attribute_terms(attr_id, options))
+        return list(ids)
+
+    def _ensure_attribute_terms(self, attr_id: int, options: List[str]) -> List[int]:
+        existing_names = self._attr_term_ids.get(attr_id)
+        if existing_names is None:
+            existing = self._request("GET", self._wc_url(f"products/attributes/{attr_id}/terms"))
+            existing_names = self._attr_term_ids[attr_id] = {t["name"]: t["id"] for t in existing}
+        # недостающие термы создаём batch-запросами, а не POST на каждую опцию
+        missing = list(dict.fromkeys(opt for opt in options if opt not in existing_names))
+        if missing:
+            # Woo принимает в batch не больше 100 элементов
+            for start in range(0, len(missing), _BATCH_LIMIT):
+                chunk = missing[start:start + _BATCH_LIMIT]
+                res = self._request(
+                    "POST",
+                    self._wc_url(f"products/attributes/{attr_id}/terms/batch"),
+                    json={"create": [{"name": opt} for opt in chunk]},
+                )
+                created = res.get("create", []) if isinstance(res, dict) else []
+                for opt, item in zip(chunk, created):
+                    # терм, созданный параллельно кем-то ещё, Woo возвращает ошибкой term_exists с id существующего
+                    term_id = item.get("id") or ((item.get("error") or {}).get("data") or {}).get("resource_id")
+                    if term_id:
+                        existing_names[opt] = term_id
+            not_created = [opt for opt in missing if opt not in existing_names]
+            if not_created:
+                raise ValueError(f"Woo не создал термы атрибута {attr_id}: {not_created}")
+        return [existing_names[opt] for opt in options]
 
     # Product brands taxonomy (e.g., product_brand)
     def ensure_term_in_taxonomy(self, taxonomy: str, name: str) -> Dict[str, Any]:
+        key = (taxonomy, name.lower())
+        return self._cached(self._term_cache, key, ("term",) + key, lambda: self._ensure_term_in_taxonomy(taxonomy, name))
+
+    def _ensure_term_in_taxonomy(self, taxonomy: str, name: str) -> Dict[str, Any]:
         # Try to find by name
         terms = self._request("GET", self._wp_url(taxonomy), params={"search": name, "per_page": 100})
         for t in terms if isinstance(terms, list) else []:
@@ -205,8 +364,17 @@ class WooClient:
         return created
 
     # Media (via WP REST)
-    def post_media_binary(self, filename: str, data: bytes, alt: str = "") -> Dict[str, Any]:
-        headers = {"Content-Type": "application/octet-stream", "Content-Disposition": f"attachment; filename={filename}"}
-        res = self._request("POST", self._wp_url("media"), headers=headers, json=None)  # placeholder
-        # Для простоты минимального E2E не загружаем бинарники
-        return {"id": 0, "source_url": ""}
+    def post_media(self, filename: str, source: str | Path | IO[bytes], alt: str = "") -> Dict[str, Any]:
+        # тело отдаём httpx файлом: он читается кусками при отправке, картинка целиком в памяти не лежит
+        headers = {
+            "Content-Type": mimetypes.guess_type(filename)[0] or "application/octet-stream",
+            "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}",
+        }
+        if isinstance(source, (str, Path)):
+            with open(source, "rb") as f:
+                media = self._request("POST", self._wp_url("media"), headers=headers, content=f)
+        else:
+            media = self._request("POST", self._wp_url("media"), headers=headers, content=source)
+        if alt and media.get("id"):
+            media = self._request("POST", self._wp_url(f"media/{media['id']}"), json={"alt_text": alt})
+        return media
@@ -0,0 +1,22 @@
+from scraper.config import get_settings
+
+
+def test_get_settings_cached(monkeypatch):
+    get_settings.cache_clear()
+    monkeypatch.setenv("RATE_LIMIT_RPS", "2")
+    s = get_settings()
+    assert get_settings() is s
+    monkeypatch.setenv("RATE_LIMIT_RPS", "3")
+    assert get_settings().rate_limit_rps == 2.0
+    get_settings.cache_clear()
+    assert get_settings().rate_limit_rps == 3.0
+    get_settings.cache_clear()
+
+
+def test_str_to_bool():
+    from scraper.config import str_to_bool
+
+    assert str_to_bool(None, True) is True
+    assert str_to_bool(" Yes ", False) is True
+    assert str_to_bool("on", False) is True
+    assert str_to_bool("0", True) is False
@@ -0,0 +1,18 @@
+import hashlib
+
+import httpx
+
+from scraper import media
+
+
+def test_download_image_streams_to_file(monkeypatch):
+    body = b"\x89PNG" + b"x" * 200_000
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=body))
+    monkeypatch.setattr(media, "_client", httpx.Client(transport=transport))
+    filename, path, digest = media.download_image("https://cdn.example/img/%D1%84%D0%BE%D1%82%D0%BE.png")
+    try:
+        assert filename == "фото.png"
+        assert path.read_bytes() == body
+        assert digest == hashlib.blake2b(body, digest_size=16).hexdigest()
+    finally:
+        path.unlink()
@@ -0,0 +1,128 @@
+from pathlib import Path
+
+from scraper.config import Settings
+from scraper.main import _push_product
+from scraper.models import Product
+from scraper.store import init_db
+
+
+class FakeWoo:
+    def __init__(self):
+        self.calls = []
+
+    def ensure_categories_hierarchy(self, slugs, names=None):
+        return list(range(1, len(slugs) + 1))
+
+    def ensure_term_in_taxonomy(self, taxonomy, name):
+        return {"id": 42, "name": name}
+
+    def ensure_global_attribute(self, slug):
+        return 5
+
+    def ensure_attribute_terms(self, attr_id, options):
+        return [1 for _ in options]
+
+    def create_product(self, payload):
+        self.calls.append(("create", payload))
+        return {"id": 100, "status": payload["status"]}
+
+    def update_product(self, product_id, payload):
+        self.calls.append(("update", payload))
+        return {"id": product_id}
+
+
+def test_push_simple_product_single_request(tmp_path: Path):
+    db = tmp_path / "t.db"
+    init_db(db)
+    settings = Settings(wp_base_url="", wc_consumer_key=None, wc_consumer_secret=None, wp_user=None, wp_app_password=None, db_path=db)
+    product = Product(
+        external_id="p-1",
+        name="P",
+        regular_price=10.0,
+        categories=["a", "b"],
+        attributes={"pa_brand": ["CROOZ"], "pa_color": ["red"]},
+    )
+    client = FakeWoo()
+    result = _push_product(product, client, settings, "draft")
+    assert result["id"] == 100
+    assert len(client.calls) == 1
+    kind, payload = client.calls[0]
+    assert kind == "create"
+    assert payload["categories"] == [{"id": 1}, {"id": 2}]
+    assert payload["brands"] == [{"id": 42}]
+    assert payload["attributes"] == [{"id": 5, "visible": True, "options": ["red"]}]
+
+
+def test_rejected_extras_on_existing_product_never_create():
+    import httpx
+
+    from scraper.main import _upsert_product_with_extras
+
+    class RejectingWoo(FakeWoo):
+        def update_product(self, product_id, payload):
+            self.calls.append(("update", payload))
+            if "brands" in payload:
+                request = httpx.Request("PUT", "https://shop.example")
+                raise httpx.HTTPStatusError("bad", request=request, response=httpx.Response(400, request=request))
+            return {"id": product_id}
+
+    client = RejectingWoo()
+    result = _upsert_product_with_extras(client, {"woo_product_id": 7}, {"name": "P"}, {"categories": [{"id": 1}], "brands": [{"id": 42}]})
+    assert result["id"] == 7
+    assert [kind for kind, _ in client.calls] == ["update", "update", "update", "update"]
+    assert client.calls[2][1] == {"categories": [{"id": 1}]}
+
+
+def test_push_batch_pushes_each_external_id_once(tmp_path: Path, monkeypatch):
+    import time
+
+    from scraper import config, main, scrape, wc
+
+    db = tmp_path / "t.db"
+    init_db(db)
+    urls = tmp_path / "urls.txt"
+    urls.write_text("https://donor.example/p/a/\nhttps://donor.example/p/a\nhttps://donor.example/other/a\nhttps://donor.example/p/b\n")
+    settings = Settings(wp_base_url="", wc_consumer_key=None, wc_consumer_secret=None, wp_user=None, wp_app_password=None, db_path=db)
+
+    class BatchWoo(FakeWoo):
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            pass
+
+        def prefetch_indexes(self):
+            pass
+
+        def create_product(self, payload):
+            # create медленнее соседних воркеров: без дедупа второй поток успевает прочитать пустой чекпоинт
+            time.sleep(0.05)
+            return super().create_product(payload)
+
+    client = BatchWoo()
+    monkeypatch.setattr(config, "get_settings", lambda: settings)
+    monkeypatch.setattr(wc.WooClient, "from_settings", classmethod(lambda cls, s=None: client))
+    monkeypatch.setattr(scrape, "scrape_product", lambda url, profile, client=None: Product(external_id=scrape._external_id_from_url(url), name="P", regular_price=1.0))
+    main.push_batch(
+        profile="x", file=urls, draft=True, publish=False, limit=50, offset=0, resume=False,
+        skip_processed=False, only_if_changed=False, concurrency=4,
+    )
+    assert sorted(p["meta_data"][0]["value"] for kind, p in client.calls if kind == "create") == ["a", "b"]
+
+
+def test_rejected_base_update_on_existing_product_never_creates():
+    import httpx
+    import pytest
+
+    from scraper.main import _upsert_product_with_extras
+
+    class RejectingWoo(FakeWoo):
+        def update_product(self, product_id, payload):
+            self.calls.append(("update", payload))
+            request = httpx.Request("PUT", "https://shop.example")
+            raise httpx.HTTPStatusError("bad", request=request, response=httpx.Response(400, request=request))
+
+    client = RejectingWoo()
+    with pytest.raises(httpx.HTTPStatusError):
+        _upsert_product_with_extras(client, {"woo_product_id": 7}, {"name": "P"}, {"brands": [{"id": 42}]})
+    assert [kind for kind, _ in client.calls] == ["update", "update"]
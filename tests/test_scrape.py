@@ -0,0 +1,433 @@
+from pathlib import Path
+
+import httpx
+import pytest
+
+from scraper.config import get_settings
+from scraper.scrape import scrape_product
+
+PRODUCT_HTML = """
+<html><body>
+<ul class="breadcrumbs">
+  <li class="breadcrumbs-i"><span itemprop="name">Головна</span></li>
+  <li class="breadcrumbs-i"><span itemprop="name">Нарощення</span></li>
+  <li class="breadcrumbs-i"><span itemprop="name">Builder Gel</span></li>
+  <li class="breadcrumbs-i"><span itemprop="name">Гель CROOZ</span></li>
+</ul>
+<h1 class="product-title">Гель   CROOZ</h1>
+<div class="product-header__code">Артикул: CR-01</div>
+<div class="product-price__item">250,50 грн</div>
+<div class="product-description j-product-description"><div class="text">
+  <p style="color:red"><font color="x">Опис</font> товару</p>
+  <p> <br> </p>
+  <script>alert(1)</script>
+</div></div>
+<ul class="gallery__photos-list">
+  <li class="gallery__item"><img class="gallery__photo-img" src="/img/1.jpg" alt="one"></li>
+  <li class="gallery__item"><img class="gallery__photo-img" src="/img/2.jpg"></li>
+  <li class="gallery__item"><img class="gallery__photo-img" src="/img/1.jpg"></li>
+</ul>
+</body></html>
+"""
+
+
+@pytest.fixture
+def donor_env(monkeypatch):
+    monkeypatch.chdir(Path(__file__).resolve().parent.parent)
+    monkeypatch.setenv("RATE_LIMIT_RPS", "0")
+    get_settings.cache_clear()
+    yield
+    get_settings.cache_clear()
+
+
+def test_scrape_simple_product(donor_env):
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text=PRODUCT_HTML))
+    with httpx.Client(transport=transport) as client:
+        product = scrape_product("https://crooz.in.ua/gel-crooz/", profile="donor-example", client=client)
+    assert product.external_id == "gel-crooz"
+    assert product.name == "Гель CROOZ"
+    assert product.sku == "CR-01"
+    assert product.regular_price == 250.5
+    assert product.type == "simple"
+    assert product.description_html.strip() == "<p>Опис товару</p>"
+    assert [im.url for im in product.images] == ["https://crooz.in.ua/img/1.jpg", "https://crooz.in.ua/img/2.jpg"]
+    assert product.images[1].alt == "Гель CROOZ"
+    assert product.categories == ["naroshchennya", "builder-gel"]
+    assert product.attributes == {"pa_brand": ["CROOZ"]}
+
+
+
+def test_breadcrumb_without_name_element_is_the_product_crumb(donor_env):
+    html = PRODUCT_HTML.replace(
+        '<li class="breadcrumbs-i"><span itemprop="name">Гель CROOZ</span></li>',
+        '<li class="breadcrumbs-i">Гель CROOZ</li>',
+    )
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text=html))
+    with httpx.Client(transport=transport) as client:
+        product = scrape_product("https://crooz.in.ua/gel-crooz/", profile="donor-example", client=client)
+    assert product.categories == ["naroshchennya", "builder-gel"]
+
+
+VARIABLE_HTML = """
+<html><body>
+<h1 class="product-title">Гель CROOZ, 15 ml</h1>
+<div class="product-price__item">100 грн</div>
+<div class="product__modifications">
+  <form method="post" data-action="/ajax/modification">
+    <input type="hidden" name="param[obem]" data-prop="obem">
+    <div class="modification"><div class="modification__body"><div class="modification__list">
+      <a class="modification__button modification__button--active" data-value="1">15 ml</a>
+      <a class="modification__button" data-value="2">30 ml</a>
+      <a class="modification__button" data-value="0">Будь-який</a>
+    </div></div></div>
+  </form>
+</div>
+</body></html>
+"""
+
+
+def test_scrape_variable_product_via_ajax(donor_env):
+    prices = {"1": "100", "2": "180"}
+
+    def handler(request):
+        if request.url.path == "/ajax/modification":
+            return httpx.Response(200, json={"price": prices[request.url.params["param[obem]"]]})
+        return httpx.Response(200, text=VARIABLE_HTML)
+
+    with httpx.Client(transport=httpx.MockTransport(handler)) as client:
+        product = scrape_product("https://crooz.in.ua/gel-crooz/", profile="donor-example", client=client)
+    assert product.type == "variable"
+    assert product.name == "Гель CROOZ"
+    assert product.attributes["pa_obyem"] == ["15 ml", "30 ml"]
+    assert product.default_attributes == {"pa_obyem": "15 ml"}
+    assert [(v.attributes["pa_obyem"], v.regular_price) for v in product.variations] == [("15 ml", 100.0), ("30 ml", 180.0)]
+
+
+def test_profile_loaders_cached_until_file_changes(tmp_path, monkeypatch):
+    import os
+
+    from scraper.scrape import _load_csv_map, _load_manifest
+
+    monkeypatch.chdir(tmp_path)
+    prof = tmp_path / "profiles" / "p"
+    prof.mkdir(parents=True)
+    mf = prof / "manifest.yaml"
+    mf.write_text("site: {base_url: 'https://a'}\n", encoding="utf-8")
+    first = _load_manifest("p")
+    assert _load_manifest("p") is first
+    mf.write_text("site: {base_url: 'https://b'}\n", encoding="utf-8")
+    os.utime(mf, ns=(0, mf.stat().st_mtime_ns + 1_000_000))
+    assert _load_manifest("p")["site"]["base_url"] == "https://b"
+    assert _load_csv_map(prof / "missing.csv") == {}
+
+    from scraper.scrape import _load_values_maps
+
+    assert _load_values_maps("p") == {}
+    values = prof / "values"
+    values.mkdir()
+    (values / "pa_obyem.csv").write_text("donor_value,normalized_value\n15мл,15 ml\n", encoding="utf-8")
+    os.utime(values, ns=(0, values.stat().st_mtime_ns + 1_000_000))
+    assert _load_values_maps("p") == {"pa_obyem": {"15мл": "15 ml"}}
+
+
+def test_product_selectors_validated_once(tmp_path, monkeypatch):
+    import os
+
+    from scraper.scrape import _product_selectors
+
+    monkeypatch.chdir(tmp_path)
+    prof = tmp_path / "profiles" / "p"
+    prof.mkdir(parents=True)
+    (prof / "manifest.yaml").write_text("product: {selectors: {title: '.t', sku: '', price_sale: 'a['}}\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="price_sale"):
+        _product_selectors("p")
+    mf = prof / "manifest.yaml"
+    mf.write_text("product: {selectors: {title: ' .t ', sku: ''}}\n", encoding="utf-8")
+    os.utime(mf, ns=(0, mf.stat().st_mtime_ns + 1_000_000))
+    sels = _product_selectors("p")
+    assert sels["title"] == ".t"
+    assert sels["sku"] is None and sels["gallery_imgs"] is None
+
+
+def test_collect_category_urls_follows_pagination(donor_env):
+    from scraper.scrape import collect_category_urls
+
+    pages = {
+        "https://crooz.in.ua/c/": '<a class="catalogCard-image" href="/p1"></a><a class="catalogCard-image" href="/p2"></a><a class="pager__item--forth" href="/c/2"></a>',
+        "https://crooz.in.ua/c/2": '<a class="catalogCard-image" href="/p3"></a><a class="pager__item--forth" href="/c/3"></a>',
+        "https://crooz.in.ua/c/3": '<a class="catalogCard-image" href="/p4"></a>',
+    }
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text=pages[str(request.url)]))
+    with httpx.Client(transport=transport) as client:
+        urls = list(collect_category_urls("https://crooz.in.ua/c/", "donor-example", client=client))
+        assert urls == [f"https://crooz.in.ua/p{i}" for i in range(1, 5)]
+        assert len(list(collect_category_urls("https://crooz.in.ua/c/", "donor-example", max_pages=2, client=client))) == 3
+
+
+def test_collect_category_urls_param_pagination(donor_env, monkeypatch, tmp_path):
+    import shutil
+
+    from scraper.scrape import collect_category_urls
+
+    shutil.copytree(Path.cwd() / "profiles", tmp_path / "profiles")
+    manifest = tmp_path / "profiles" / "donor-example" / "manifest.yaml"
+    manifest.write_text(manifest.read_text(encoding="utf-8").replace('type: "next"', 'type: "param"'), encoding="utf-8")
+    monkeypatch.chdir(tmp_path)
+    pages = {
+        "https://crooz.in.ua/c/": '<a class="catalogCard-image" href="/p1"></a><a class="catalogCard-image" href="/p2"></a>',
+        "https://crooz.in.ua/c/?page=2": '<a class="catalogCard-image" href="/p3"></a>',
+        # CMS отдаёт последнюю страницу на любой больший номер
+        "https://crooz.in.ua/c/?page=3": '<a class="catalogCard-image" href="/p3"></a>',
+    }
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text=pages.get(str(request.url), "")))
+    with httpx.Client(transport=transport) as client:
+        urls = list(collect_category_urls("https://crooz.in.ua/c/", "donor-example", client=client))
+        assert urls == [f"https://crooz.in.ua/p{i}" for i in range(1, 4)]
+        assert len(list(collect_category_urls("https://crooz.in.ua/c/", "donor-example", max_pages=1, client=client))) == 2
+
+
+def test_collect_all_fetches_each_category_once(donor_env, monkeypatch):
+    from scraper import scrape
+
+    pages = {
+        "https://crooz.in.ua/katalog/": '<a class="children-pages-menu__link" href="/gel/"></a><a class="catalogCard-image" href="/p1"></a>',
+        "https://crooz.in.ua/gel/": '<a class="children-pages-menu__link" href="/katalog/"></a><a class="catalogCard-image" href="/p1"></a><a class="catalogCard-image" href="/p2"></a>',
+    }
+    requested = []
+
+    def handler(request):
+        requested.append(str(request.url))
+        return httpx.Response(200, text=pages[str(request.url)])
+
+    monkeypatch.setattr(scrape, "_http_client", lambda settings: httpx.Client(transport=httpx.MockTransport(handler)))
+    urls = list(scrape.collect_all_product_urls("donor-example"))
+    assert urls == ["https://crooz.in.ua/p1", "https://crooz.in.ua/p2"]
+    assert requested == ["https://crooz.in.ua/katalog/", "https://crooz.in.ua/gel/"]
+
+
+def test_scan_ajax_json_prefers_higher_priority_keys():
+    from scraper.scrape import _scan_ajax_json
+
+    data = {"new_price": "90", "img": "/b.jpg", "price": 100, "code": ["x"], "article": "A-1", "image": "/a.jpg"}
+    assert _scan_ajax_json(data) == {"price": 100, "sku": "A-1", "image": "/a.jpg"}
+    assert _scan_ajax_json({"html": "<p>"}) == {}
+
+
+def test_abs_url_matches_urljoin():
+    from urllib.parse import urljoin
+
+    from scraper.scrape import _abs_url
+
+    for base in ("https://crooz.in.ua", "https://crooz.in.ua/katalog/gel/?page=2", "http://a.b:8080/x"):
+        for url in ("/img/1.jpg?v=2#f", "//cdn.example.com/a.png", "https://x.y/z", "rel/p.jpg", "../up", "/a/../b", "", "?page=3"):
+            assert _abs_url(base, url) == urljoin(base, url), (base, url)
+
+
+def test_html_from_bytes_handles_non_utf8_pages():
+    from scraper.scrape import _html_from_bytes
+
+    body = "<h1>Гель</h1>"
+    assert _html_from_bytes(body.encode("utf-8"), "utf-8").css_first("h1").text() == "Гель"
+    assert _html_from_bytes(body.encode("cp1251"), "windows-1251").css_first("h1").text() == "Гель"
+
+
+def test_scrape_variable_product_via_variant_pages(donor_env):
+    html = VARIABLE_HTML.replace('data-value="1"', 'href="/gel-crooz-15-ml/" data-value="1"').replace(
+        'data-value="2"', 'href="/gel-crooz-30-ml/" data-value="2"'
+    )
+    pages = {
+        "/gel-crooz/": html,
+        "/gel-crooz-15-ml/": '<div class="product-price__item product-price__item--new">100 грн</div><div class="product-header__code">Артикул: G-15</div>',
+        "/gel-crooz-30-ml/": '<div class="product-price__item product-price__item--new">180 грн</div><div class="product-header__code">Артикул: G-30</div>',
+    }
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text=pages[request.url.path]))
+    with httpx.Client(transport=transport) as client:
+        product = scrape_product("https://crooz.in.ua/gel-crooz/", profile="donor-example", client=client)
+    assert [(v.attributes["pa_obyem"], v.sku, v.regular_price) for v in product.variations] == [
+        ("15 ml", "G-15", 100.0),
+        ("30 ml", "G-30", 180.0),
+    ]
+
+
+def test_oversized_page_is_rejected(donor_env, monkeypatch):
+    monkeypatch.setenv("MAX_PAGE_BYTES", "1000")
+    get_settings.cache_clear()
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text=PRODUCT_HTML + " " * 2000))
+    with httpx.Client(transport=transport) as client:
+        with pytest.raises(ValueError, match="MAX_PAGE_BYTES"):
+            scrape_product("https://crooz.in.ua/gel-crooz/", profile="donor-example", client=client)
+
+
+def test_csv_map_reads_excel_bom(tmp_path):
+    from scraper.scrape import _load_csv_map
+
+    path = tmp_path / "attributes.map.csv"
+    path.write_bytes("donor_name,pa_slug\nОбʼєм,pa_obyem\n".encode("utf-8-sig"))
+    assert _load_csv_map(path) == {"Обʼєм": "pa_obyem"}
+
+
+def test_debug_price_prefers_sale_over_earlier_regular():
+    from selectolax.lexbor import LexborHTMLParser
+    from scraper.scrape import _DebugProfile, _debug_price_el
+
+    cfg = _DebugProfile(
+        site_base="",
+        sel={"price_sale": ".new", "price_regular": ".old"},
+        pa_slug="pa_obyem",
+        price_any=".new, .old",
+    )
+    tree = LexborHTMLParser('<p class="old">200</p><p class="new">150</p>')
+    assert _debug_price_el(tree.body, cfg).text() == "150"
+    assert _debug_price_el(LexborHTMLParser('<p class="old">200</p>').body, cfg).text() == "200"
+
+
+def test_debug_variant_urls_keeps_button_order(donor_env, monkeypatch):
+    from scraper import scrape
+
+    pages = {
+        "/gel-crooz-15-ml/": VARIABLE_HTML,
+        "/gel-crooz-30-ml/": '<div class="product-price__item product-price__item--new">180 грн</div>',
+    }
+    requested = []
+
+    def handler(request):
+        requested.append(request.url.path)
+        return httpx.Response(200, text=pages[request.url.path])
+
+    monkeypatch.setattr(scrape, "_http_client", lambda settings: httpx.Client(transport=httpx.MockTransport(handler)))
+    out = scrape.debug_variant_urls("https://crooz.in.ua/gel-crooz-15-ml/", "donor-example")
+    assert requested == ["/gel-crooz-15-ml/", "/gel-crooz-30-ml/"]
+    assert [(e["label"], e["url"], e["price"]) for e in out] == [
+        ("15 ml", "https://crooz.in.ua/gel-crooz-15-ml/", None),
+        ("30 ml", "https://crooz.in.ua/gel-crooz-30-ml/", "180 грн"),
+    ]
+
+
+def test_debug_variations_refetches_page_only_after_session_change(donor_env, monkeypatch, tmp_path):
+    import shutil
+
+    from scraper import scrape
+
+    shutil.copytree(Path.cwd() / "profiles", tmp_path / "profiles")
+    monkeypatch.chdir(tmp_path)
+    requested = []
+    set_cookie = {"value": False}
+
+    def handler(request):
+        requested.append(request.url.path)
+        if request.url.path == "/ajax/modification":
+            val = request.url.params["param[obem]"]
+            headers = {"set-cookie": f"variant={val}; Path=/"} if set_cookie["value"] else {}
+            if set_cookie.get("json"):
+                return httpx.Response(200, json={"price": 150, "sku": f"SKU-{val}"}, headers=headers)
+            return httpx.Response(200, text="<p>same</p>", headers=headers)
+        return httpx.Response(200, text=VARIABLE_HTML)
+
+    monkeypatch.setattr(scrape, "_http_client", lambda settings: httpx.Client(transport=httpx.MockTransport(handler)))
+    out = scrape.debug_variations("https://crooz.in.ua/gel-crooz/", "donor-example")
+    assert [e["label"] for e in out] == ["15 ml", "30 ml"]
+    # ajax не трогает сессию: страница скачана один раз, опции опрошены параллельно
+    assert sorted(requested) == ["/ajax/modification", "/ajax/modification", "/gel-crooz/"]
+
+    # ajax ставит куки: опции проходятся заново по очереди, страница перечитывается после смены сессии
+    requested.clear()
+    set_cookie["value"] = True
+    out = scrape.debug_variations("https://crooz.in.ua/gel-crooz/", "donor-example")
+    assert [e["label"] for e in out] == ["15 ml", "30 ml"]
+    assert requested[3:] == ["/ajax/modification", "/gel-crooz/", "/ajax/modification", "/gel-crooz/"]
+
+    # ajax отвечает JSON с полями вариации: страницу не перечитываем, даже если ставятся куки
+    requested.clear()
+    set_cookie["json"] = True
+    out = scrape.debug_variations("https://crooz.in.ua/gel-crooz/", "donor-example")
+    assert [(e["label"], e["price"], e["sku"]) for e in out] == [("15 ml", "150", "SKU-1"), ("30 ml", "150", "SKU-2")]
+    assert sorted(requested) == ["/ajax/modification", "/ajax/modification", "/gel-crooz/"]
+
+
+def test_debug_ajax_post_fallback_is_rate_limited_and_retried(donor_env, monkeypatch, tmp_path):
+    import shutil
+
+    from scraper import scrape
+
+    shutil.copytree(Path.cwd() / "profiles", tmp_path / "profiles")
+    monkeypatch.chdir(tmp_path)
+    posts = []
+
+    def handler(request):
+        if request.url.path == "/ajax/modification":
+            if request.method == "GET":
+                return httpx.Response(405)
+            posts.append(request.content)
+            # первый POST каждой опции — 503, повтор проходит
+            return httpx.Response(503 if posts.count(request.content) == 1 else 200, headers={"retry-after": "0"}, text="<p>ok</p>")
+        return httpx.Response(200, text=VARIABLE_HTML)
+
+    class CountingRate:
+        waits = 0
+
+        def wait(self):
+            CountingRate.waits += 1
+
+    monkeypatch.setattr(scrape, "_http_client", lambda settings: httpx.Client(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(scrape, "_donor_rate_limiter", lambda rps: CountingRate())
+    out = scrape.debug_variations("https://crooz.in.ua/gel-crooz/", "donor-example")
+    assert [e["ajax_post"].split()[0] for e in out] == ["200", "200"]
+    assert len(posts) == 4
+    # страница + два GET + четыре POST: каждая попытка через лимитер
+    assert CountingRate.waits == 7
+
+
+def test_debug_variations_batch_reports_each_url(donor_env, monkeypatch, tmp_path):
+    import shutil
+
+    from scraper import scrape
+
+    shutil.copytree(Path.cwd() / "profiles", tmp_path / "profiles")
+    monkeypatch.chdir(tmp_path)
+
+    def handler(request):
+        if request.url.path == "/missing/":
+            return httpx.Response(404)
+        if request.url.path == "/ajax/modification":
+            return httpx.Response(200, text="<p>same</p>")
+        return httpx.Response(200, text=VARIABLE_HTML)
+
+    monkeypatch.setattr(scrape, "_http_client", lambda settings: httpx.Client(transport=httpx.MockTransport(handler)))
+    urls = [f"https://crooz.in.ua/gel-{i}/" for i in range(5)] + ["https://crooz.in.ua/missing/"]
+    out = dict(scrape.debug_variations_batch(iter(urls), "donor-example", workers=2))
+    assert set(out) == set(urls)
+    assert [e["label"] for e in out[urls[0]]] == ["15 ml", "30 ml"]
+    assert "error" in out[urls[-1]][0]
+    # дампы ajax-ответов у каждого товара свои, одинаковые опции разных товаров не перетираются
+    dumps = {p.name for p in (scrape._debug_dir()).glob("ajax_get_*.html")}
+    assert {f"ajax_get_gel-{i}_1.html" for i in range(5)} <= dumps
+
+
+def test_debug_fetch_retries_transient_errors(donor_env, monkeypatch):
+    from scraper import scrape
+
+    calls = {"page": 0, "ajax": 0}
+
+    def handler(request):
+        if request.url.path == "/missing/":
+            calls["page"] += 1
+            return httpx.Response(404)
+        if request.url.path == "/ajax/":
+            calls["ajax"] += 1
+            return httpx.Response(503, headers={"retry-after": "0"})
+        calls["page"] += 1
+        if calls["page"] == 1:
+            return httpx.Response(503, headers={"retry-after": "0"})
+        return httpx.Response(200, text=VARIABLE_HTML)
+
+    rate = scrape.RateLimiter(1000)
+    with httpx.Client(transport=httpx.MockTransport(handler)) as client:
+        tree = scrape._debug_fetch_html(client, "https://crooz.in.ua/gel-crooz/", rate)
+        assert tree.css_first("h1") is not None and calls["page"] == 2
+        # исчерпав попытки, ajax отдаёт последний ответ, а не исключение
+        assert scrape._debug_get(client, "https://crooz.in.ua/ajax/", rate).status_code == 503
+        assert calls["ajax"] == 3
+        calls["page"] = 0
+        with pytest.raises(httpx.HTTPStatusError):
+            scrape._debug_fetch_html(client, "https://crooz.in.ua/missing/", rate)
+        assert calls["page"] == 1
@@ -0,0 +1,70 @@
+import sqlite3
+
+from scraper.store import checkpoint_batch, get_checkpoint_by_external_id, init_db, upsert_product_checkpoint
+
+
+def test_checkpoint_roundtrip(tmp_path):
+    db = tmp_path / "t.db"
+    init_db(db)
+    upsert_product_checkpoint("ext-1", 10, db_path=db)
+    upsert_product_checkpoint("ext-1", 11, db_path=db, content_hash='"etag-1"')
+    row = get_checkpoint_by_external_id("ext-1", db_path=db)
+    assert row["woo_product_id"] == 11
+    assert row["content_hash"] == '"etag-1"'
+    assert get_checkpoint_by_external_id("missing", db_path=db) is None
+
+
+def test_init_db_migrates_old_schema(tmp_path):
+    db = tmp_path / "old.db"
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE products (external_id TEXT PRIMARY KEY, woo_product_id INTEGER, last_pushed_at TEXT DEFAULT CURRENT_TIMESTAMP)")
+    conn.commit()
+    conn.close()
+    init_db(db)
+    upsert_product_checkpoint("ext-1", 1, db_path=db, content_hash="h")
+    assert get_checkpoint_by_external_id("ext-1", db_path=db)["content_hash"] == "h"
+
+
+def test_checkpoint_batch_commits_in_chunks(tmp_path):
+    db = tmp_path / "t.db"
+    init_db(db)
+    with checkpoint_batch(db, flush_every=2) as batch:
+        batch.upsert("ext-1", 1)
+        # своя незакоммиченная запись видна через батч, но не снаружи
+        assert batch.get("ext-1")["woo_product_id"] == 1
+        assert get_checkpoint_by_external_id("ext-1", db_path=db) is None
+        batch.upsert("ext-2", 2, content_hash="h")
+        assert get_checkpoint_by_external_id("ext-1", db_path=db)["woo_product_id"] == 1
+        batch.upsert("ext-3", 3)
+    assert get_checkpoint_by_external_id("ext-3", db_path=db)["woo_product_id"] == 3
+    assert get_checkpoint_by_external_id("ext-2", db_path=db)["content_hash"] == "h"
+
+
+def test_bulk_checkpoints_keep_row_order(tmp_path):
+    from scraper.store import upsert_product_checkpoints
+
+    db = tmp_path / "t.db"
+    init_db(db)
+    upsert_product_checkpoints([("ext-1", 1, None), ("ext-2", 2, "h2"), ("ext-1", 3, "h1"), ("ext-2", 4, None)], db_path=db)
+    assert get_checkpoint_by_external_id("ext-1", db_path=db)["woo_product_id"] == 3
+    assert get_checkpoint_by_external_id("ext-1", db_path=db)["content_hash"] == "h1"
+    # строка без хэша не затирает сохранённый хэш
+    assert dict(get_checkpoint_by_external_id("ext-2", db_path=db), last_pushed_at=None) == {
+        "external_id": "ext-2", "woo_product_id": 4, "last_pushed_at": None, "content_hash": "h2"
+    }
+
+
+def test_checkpoint_batch_shares_db_with_concurrent_writes(tmp_path):
+    db = tmp_path / "t.db"
+    init_db(db)
+    upsert_product_checkpoint("ext-1", 1, db_path=db, content_hash="h")
+    with checkpoint_batch(db, flush_every=10) as batch:
+        batch.upsert("ext-1", 5)
+        # запись мимо батча при открытом батче не блокируется
+        upsert_product_checkpoint("ext-2", 2, db_path=db)
+        assert batch.get("ext-1") | {"last_pushed_at": None} == {
+            "external_id": "ext-1", "woo_product_id": 5, "last_pushed_at": None, "content_hash": "h"
+        }
+        assert batch.get("ext-2")["woo_product_id"] == 2
+    assert get_checkpoint_by_external_id("ext-1", db_path=db)["content_hash"] == "h"
+    assert get_checkpoint_by_external_id("ext-1", db_path=db)["woo_product_id"] == 5
@@ -0,0 +1,60 @@
+from scraper import utils
+from scraper.utils import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(round(seconds, 6))
+        self.now += seconds
+
+
+def test_rate_limiter_allows_burst_up_to_rps(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(utils.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(utils.time, "sleep", clock.sleep)
+    limiter = RateLimiter(4)
+    for _ in range(4):
+        limiter.wait()
+    assert clock.slept == []
+    limiter.wait()
+    assert clock.slept == [0.25]
+    clock.now += 1.0
+    for _ in range(4):
+        limiter.wait()
+    assert clock.slept == [0.25]
+
+
+def test_rate_limiter_slow_rate_spaces_requests(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(utils.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(utils.time, "sleep", clock.sleep)
+    limiter = RateLimiter(0.5)
+    limiter.wait()
+    limiter.wait()
+    assert clock.slept == [2.0]
+    RateLimiter(0).wait()
+
+
+def test_rate_limiter_sleeps_outside_lock(monkeypatch):
+    clock = FakeClock()
+    limiter = RateLimiter(1)
+
+    def sleep(seconds):
+        assert not limiter._lock.locked()
+        clock.sleep(seconds)
+
+    monkeypatch.setattr(utils.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(utils.time, "sleep", sleep)
+    limiter._last = clock.now
+    limiter.wait()
+    limiter.wait()
+    limiter.wait()
+    # ёмкость 1: каждый следующий вызов ждёт свой слот через 1 с
+    assert clock.slept == [1.0, 1.0]
@@ -0,0 +1,205 @@
+from scraper.wc import WooClient
+
+
+def _client(responses):
+    client = WooClient(base_url="https://shop.example", api_version="wc/v3", auth=("k", "s"), rate_limit_rps=0)
+    calls = []
+
+    def fake_request(method, url, **kwargs):
+        calls.append((method, url))
+        return responses(method, url, kwargs)
+
+    client._request = fake_request  # type: ignore[method-assign]
+    return client, calls
+
+
+def test_ensure_global_attribute_memoized():
+    client, calls = _client(lambda m, u, kw: [{"id": 7, "slug": "pa_obyem", "name": "Obyem"}])
+    assert client.ensure_global_attribute("pa_obyem") == 7
+    assert client.ensure_global_attribute("pa_obyem") == 7
+    assert len(calls) == 1
+
+
+def test_ensure_term_in_taxonomy_memoized():
+    client, calls = _client(lambda m, u, kw: [{"id": 3, "name": "CROOZ"}])
+    assert client.ensure_term_in_taxonomy("product_brand", "CROOZ")["id"] == 3
+    assert client.ensure_term_in_taxonomy("product_brand", "crooz")["id"] == 3
+    assert len(calls) == 1
+
+
+def test_ensure_categories_hierarchy_memoized():
+    existing = [{"id": 1, "slug": "parfum", "parent": 0}]
+
+    def responses(method, url, kw):
+        if method == "GET":
+            return existing if kw["params"]["page"] == 1 else []
+        return {"id": 2, "slug": kw["json"]["slug"], "parent": kw["json"].get("parent", 0)}
+
+    client, calls = _client(responses)
+    assert client.ensure_categories_hierarchy(["parfum", "men"]) == [1, 2]
+    assert client.ensure_categories_hierarchy(["parfum", "men"]) == [1, 2]
+    # индекс категорий грузится один раз; новая категория попадает в него без перечитывания
+    assert client.ensure_categories_hierarchy(["parfum"]) == [1]
+    assert client.find_category_by_slug("men")["id"] == 2
+    # неполная первая страница — последняя, за пустой второй не ходим
+    assert [m for m, _ in calls] == ["GET", "POST"]
+
+
+def test_request_reuses_one_http_client():
+    import httpx
+
+    seen = []
+    transport = httpx.MockTransport(lambda request: seen.append(request.url.path) or httpx.Response(200, json=[]))
+    with WooClient(base_url="https://shop.example", api_version="wc/v3", auth=("k", "s"), rate_limit_rps=0) as client:
+        client._client.close()
+        client._client = httpx.Client(transport=transport)
+        client.find_product_by_sku("A")
+        client.find_product_by_sku("B")
+    assert seen == ["/wp-json/wc/v3/products"] * 2
+    assert client._client.is_closed
+
+
+def test_attribute_lists_fetched_once_per_client():
+    def responses(method, url, kw):
+        if url.endswith("/products/attributes"):
+            return [{"id": 7, "slug": "pa_obyem", "name": "Obyem"}] if method == "GET" else {"id": 8, "slug": "pa_color", "name": "Color"}
+        if method == "GET":
+            return [{"id": 1, "name": "15 ml"}]
+        assert url.endswith("/terms/batch")
+        return {"create": [{"id": 2 + i, "name": t["name"]} for i, t in enumerate(kw["json"]["create"])]}
+
+    client, calls = _client(responses)
+    assert client.ensure_global_attribute("pa_obyem") == 7
+    assert client.ensure_global_attribute("Obyem") == 7
+    assert client.ensure_global_attribute("pa_color") == 8
+    assert client.ensure_attribute_terms(7, ["15 ml"]) == [1]
+    assert client.ensure_attribute_terms(7, ["15 ml", "30 ml"]) == [1, 2]
+    assert client.ensure_attribute_terms(7, ["30 ml"]) == [2]
+    assert [m for m, _ in calls] == ["GET", "POST", "GET", "POST"]
+
+
+def test_attribute_terms_created_in_one_batch():
+    def responses(method, url, kw):
+        if method == "GET":
+            return []
+        return {"create": [{"id": 5, "name": "15 ml"}, {"id": 0, "error": {"code": "term_exists", "data": {"resource_id": 6}}}]}
+
+    client, calls = _client(responses)
+    assert client.ensure_attribute_terms(7, ["15 ml", "30 ml", "15 ml"]) == [5, 6, 5]
+    assert [m for m, _ in calls] == ["GET", "POST"]
+
+
+def test_prefetch_indexes_loads_categories_and_attributes_once():
+    def responses(method, url, kw):
+        if url.endswith("/products/attributes"):
+            return [{"id": 7, "slug": "pa_obyem", "name": "Obyem"}]
+        return [{"id": 1, "slug": "parfum", "parent": 0}]
+
+    client, calls = _client(responses)
+    client.prefetch_indexes()
+    assert sorted(u.rsplit("/", 1)[-1] for _, u in calls) == ["attributes", "categories"]
+    assert client.ensure_global_attribute("pa_obyem") == 7
+    assert client.ensure_categories_hierarchy(["parfum"]) == [1]
+    client.prefetch_indexes()
+    assert len(calls) == 2
+
+
+def test_create_variations_matches_existing_regardless_of_attribute_order():
+    existing = [{"id": 11, "regular_price": "100", "attributes": [{"id": 7, "option": "15 ml"}, {"id": 9, "option": "red"}]}]
+
+    def responses(method, url, kw):
+        return existing if method == "GET" else kw["json"]
+
+    client, _ = _client(responses)
+    res = client.create_variations(5, [
+        {"attributes": [{"id": 9, "option": "red"}, {"id": 7, "option": "15 ml"}], "regular_price": "120"},
+        {"attributes": [{"id": 7, "option": "30 ml"}, {"id": 9, "option": "red"}], "regular_price": "200"},
+        {"attributes": [], "regular_price": "1"},
+    ])
+    assert res["update"] == [{"id": 11, "regular_price": "120"}]
+    assert [p["regular_price"] for p in res["create"]] == ["200"]
+
+
+def test_request_parses_json_by_header_or_first_byte():
+    import httpx
+
+    bodies = {
+        "/wp-json/wc/v3/a": httpx.Response(200, json={"id": 1}),
+        "/wp-json/wc/v3/b": httpx.Response(200, content=b"[1, 2]", headers={"content-type": "text/html"}),
+        "/wp-json/wc/v3/c": httpx.Response(200, text="ok"),
+    }
+    with WooClient(base_url="https://shop.example", api_version="wc/v3", auth=("k", "s"), rate_limit_rps=0) as client:
+        client._client = httpx.Client(transport=httpx.MockTransport(lambda r: bodies[r.url.path]))
+        assert client._request("GET", client._wc_url("a")) == {"id": 1}
+        assert client._request("GET", client._wc_url("b")) == [1, 2]
+        assert client._request("GET", client._wc_url("c")) == "ok"
+
+
+def test_request_does_not_retry_client_errors():
+    import httpx
+    import pytest
+
+    seen = []
+    with WooClient(base_url="https://shop.example", api_version="wc/v3", auth=("k", "s"), rate_limit_rps=0) as client:
+        client._client = httpx.Client(transport=httpx.MockTransport(lambda r: seen.append(r) or httpx.Response(404, json={})))
+        with pytest.raises(httpx.HTTPStatusError):
+            client._request("GET", client._wc_url("products/1"))
+    assert len(seen) == 1
+
+
+def test_post_media_streams_file_and_sets_alt(tmp_path):
+    import httpx
+
+    img = tmp_path / "фото.png"
+    img.write_bytes(b"\x89PNG" + b"x" * 100_000)
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        if request.url.path.endswith("/media"):
+            return httpx.Response(201, json={"id": 9, "source_url": "https://shop.example/фото.png"})
+        return httpx.Response(200, json={"id": 9, "alt_text": "Духи"})
+
+    with WooClient(base_url="https://shop.example", api_version="wc/v3", auth=("k", "s"), rate_limit_rps=0) as client:
+        client._client = httpx.Client(transport=httpx.MockTransport(handler))
+        media = client.post_media(img.name, img, alt="Духи")
+    assert media == {"id": 9, "alt_text": "Духи"}
+    upload = seen[0]
+    assert upload.read() == img.read_bytes()
+    assert upload.headers["content-type"] == "image/png"
+    assert upload.headers["content-length"] == str(img.stat().st_size)
+    assert [r.url.path for r in seen] == ["/wp-json/wp/v2/media", "/wp-json/wp/v2/media/9"]
+
+
+def test_attribute_terms_batch_split_by_woo_limit():
+    def responses(method, url, kw):
+        if method == "GET":
+            return []
+        return {"create": [{"id": int(t["name"]) + 1000, "name": t["name"]} for t in kw["json"]["create"]]}
+
+    client, calls = _client(responses)
+    options = [str(i) for i in range(250)]
+    assert client.ensure_attribute_terms(7, options) == [i + 1000 for i in range(250)]
+    assert [m for m, _ in calls] == ["GET", "POST", "POST", "POST"]
+
+
+def test_ensure_runs_different_keys_concurrently_and_creates_once():
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    # два разных атрибута должны одновременно оказаться внутри GET термов — иначе барьер не дождётся
+    barrier = threading.Barrier(2, timeout=2)
+
+    def responses(method, url, kw):
+        if method == "GET":
+            barrier.wait()
+            return []
+        time.sleep(0.05)
+        return {"create": [{"id": 100 + i, "name": t["name"]} for i, t in enumerate(kw["json"]["create"])]}
+
+    client, calls = _client(responses)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(client.ensure_attribute_terms, attr_id, ["15 ml"]) for attr_id in (7, 8, 7, 8)]
+        assert [f.result() for f in futures] == [[100]] * 4
+    assert sorted(m for m, _ in calls) == ["GET", "GET", "POST", "POST"]